@@ -0,0 +1,126 @@
+import collections
+import threading
+
+import pytest
+
+from vote.ballots import BUSY_ERROR, submit_ballot
+from vote.benchmark import VOTER_COUNT, create_benchmark_app, seed_open_poll
+from vote.database import get_database
+from vote.repository import get_repository
+
+TOKENS_PER_VOTER = 6
+TOKENS_PER_VOTER_SEEDED = 30
+
+
+@pytest.fixture(params=["direct", "batch"])
+def application(request, tmp_path):
+    application = create_benchmark_app(
+        str(tmp_path),
+        BALLOT_WRITER=request.param,
+        TOKEN_FAILURE_LIMIT=10_000,
+    )
+    yield application
+    application.extensions["database"].close()
+
+
+def test_concurrent_ballots(application):
+    poll_id, choice_ids, _ = seed_open_poll(application, 0)
+
+    # Every voter races with several of its tokens, and one of them twice.
+    casts = [
+        (f"B{voter_id:02d}{n:03d}", choice_ids[(voter_id + n) % 3])
+        for voter_id in range(1, VOTER_COUNT + 1)
+        for n in (0, *range(TOKENS_PER_VOTER))
+    ]
+
+    barrier = threading.Barrier(len(casts))
+    statuses = collections.Counter()
+    lock = threading.Lock()
+
+    def cast(token: str, choice_id: int) -> None:
+        client = application.test_client()
+        barrier.wait()
+        response = client.post(
+            f"/{poll_id}/vote/", data={"token": token, "choice": choice_id}
+        )
+        with lock:
+            statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=cast, args=arguments) for arguments in casts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) <= {200, 302}
+    assert statuses[302] == VOTER_COUNT
+
+    with application.app_context():
+        repository = get_repository()
+        tally = repository.tally_poll(repository.get_poll(poll_id))
+        tokens = [
+            repository.count_tokens(voter_id) for voter_id in range(1, VOTER_COUNT + 1)
+        ]
+
+    assert sum(choice["count"] for choice in tally) == VOTER_COUNT
+    assert tokens == [TOKENS_PER_VOTER_SEEDED - 1] * VOTER_COUNT
+
+
+def test_timed_out_ballot_is_not_written(tmp_path):
+    application = create_benchmark_app(
+        str(tmp_path),
+        BALLOT_WRITER="batch",
+        BALLOT_BATCH_SIZE=1,
+        BALLOT_WRITER_TIMEOUT=0.05,
+    )
+    poll_id, choice_ids, _ = seed_open_poll(application, 0)
+
+    writer = application.extensions["ballot_writer"]
+    repository = writer.repository
+    entered, release = threading.Event(), threading.Event()
+
+    class BlockedRepository:
+        def cast_ballots(self, ballots):
+            entered.set()
+            release.wait()
+            return repository.cast_ballots(ballots)
+
+    writer.repository = BlockedRepository()
+    first = writer.submit((poll_id, choice_ids[0], "B01000"))
+    entered.wait()
+
+    with application.app_context():
+        error = submit_ballot(repository, poll_id, choice_ids[0], "B02000")
+    assert error == BUSY_ERROR
+
+    release.set()
+    assert first.result(timeout=5) is None
+
+    with application.app_context():
+        assert repository.count_tokens(1) == TOKENS_PER_VOTER_SEEDED - 1
+        assert repository.count_tokens(2) == TOKENS_PER_VOTER_SEEDED
+
+    application.extensions["database"].close()
+
+
+def test_token_type_mismatch_is_rejected_from_index(tmp_path, monkeypatch):
+    application = create_benchmark_app(str(tmp_path))
+    poll_id, choice_ids, _ = seed_open_poll(application, 0)
+
+    with application.app_context():
+        database = get_database()
+        database.execute("UPDATE polls SET type = 'Geheim' WHERE id = ?", (poll_id,))
+        database.commit()
+
+    def cast_ballots(ballots):
+        pytest.fail("The ballot reached the database.")
+
+    monkeypatch.setattr(application.extensions["repository"], "cast_ballots", cast_ballots)
+
+    response = application.test_client().post(
+        f"/api/polls/{poll_id}/ballots/", json={"token": "B01000", "choice": choice_ids[0]}
+    )
+    assert response.status_code == 422
+    assert "anonymen" in response.json["error"]
+
+    application.extensions["database"].close()
@@ -0,0 +1,45 @@
+import hashlib
+import threading
+
+import pytest
+
+from vote.benchmark import create_benchmark_app
+from vote.codes import get_code_url
+from vote.database import get_database
+
+
+@pytest.fixture
+def application(tmp_path):
+    application = create_benchmark_app(
+        str(tmp_path), CODE_BASE_URL="https://vote.example.org/"
+    )
+    yield application
+    application.extensions["database"].close()
+
+
+def test_codes_use_base_url_and_are_warmed(application, tmp_path):
+    with application.test_request_context(base_url="http://10.0.0.2:8000/"):
+        url = get_code_url("ABC123", application.config["CODE_BASE_URL"])
+    assert url == "https://vote.example.org/?token=ABC123"
+
+    with application.app_context():
+        database = get_database()
+        database.execute("UPDATE tokens SET created = '2024-01-01 00:00:00'")
+        database.commit()
+
+    client = application.test_client()
+    client.post("/auth/login/", data={"username": "benchmark", "password": "benchmark"})
+    response = client.post("/voters/1/tokens/", data={"amount": 10})
+    assert response.status_code == 302
+
+    for thread in threading.enumerate():
+        if thread.name == "code-warmer":
+            thread.join()
+
+    keys = [path.name for path in (tmp_path / "codes").iterdir()]
+    assert len(keys) == 10
+    for key in keys:
+        digest = hashlib.sha256(
+            f"https://vote.example.org/?token={key}".encode("utf-8")
+        ).hexdigest()
+        assert (tmp_path / "codes" / key / f"{digest}.svg").is_file()
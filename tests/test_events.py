@@ -0,0 +1,44 @@
+import pytest
+
+from vote.benchmark import create_benchmark_app, seed_closed_polls, seed_open_poll
+from vote.database import get_database
+from vote.events import get_poll_status
+
+
+@pytest.fixture
+def application(tmp_path):
+    application = create_benchmark_app(
+        str(tmp_path), EVENTS_LIFETIME=0.2, EVENTS_RETRY=1
+    )
+    yield application
+    application.extensions["database"].close()
+
+
+def test_stream_ends_after_lifetime(application):
+    poll_id, _, _ = seed_open_poll(application, 0)
+
+    response = application.test_client().get("/events/")
+    body = response.get_data(as_text=True)
+
+    assert body.startswith("retry: 1000\n\n")
+    assert f"event: polls\ndata: [{poll_id}]\n\n" in body
+    assert f'"id": {poll_id}' in body
+
+
+def test_live_updates_are_opt_in(application):
+    client = application.test_client()
+
+    assert b"live.js" not in client.get("/").data
+    assert b"live.js" in client.get("/?live=1").data
+
+
+def test_closed_poll_results_come_from_snapshot(application):
+    seed_closed_polls(application, 3)
+
+    with application.app_context():
+        database = get_database()
+        frozen = get_poll_status(database, 3)["results"]
+        database.execute("UPDATE voters SET weight = weight + 10")
+        database.commit()
+
+        assert get_poll_status(database, 3)["results"] == frozen
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+from vote import create_app
+from vote.benchmark import LOCALE
+from vote.database import get_database
+from vote.maintenance import upgrade_database
+
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE polls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    subject TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT "Einfach",
+    state TEXT NOT NULL DEFAULT "Vorbereitet",
+    FOREIGN KEY (author_id) REFERENCES users (id),
+    CONSTRAINT type_choices CHECK (type IN ("Einfach", "Namentlich", "Gewichtet", "Geheim")),
+    CONSTRAINT state_choices CHECK (state IN ("Vorbereitet", "Offen", "Geschlossen", "Gelöscht"))
+);
+
+CREATE TABLE choices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    poll_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    FOREIGN KEY (poll_id) REFERENCES polls (id)
+);
+
+CREATE TABLE ballots (
+    choice_id INTEGER NOT NULL,
+    voter_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (choice_id) REFERENCES choices (id),
+    FOREIGN KEY (voter_id) REFERENCES tokens (id),
+    CONSTRAINT unique_ballot UNIQUE (choice_id, voter_id)
+);
+
+CREATE TABLE voters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE tokens (
+    voter_id INTEGER NOT NULL,
+    key TEXT PRIMARY KEY,
+    expired BOOLEAN NOT NULL DEFAULT FALSE,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (voter_id) REFERENCES voters (id)
+);
+
+INSERT INTO users (username, password) VALUES ('admin', 'x');
+INSERT INTO voters (name, weight) VALUES ('Fachschaft A', 9), ('Fachschaft B', 4), ('', 1);
+INSERT INTO tokens (voter_id, key, expired) VALUES
+    (1, 'AAAAAA', TRUE), (2, 'BBBBBB', TRUE), (1, 'CCCCCC', FALSE), (3, 'DDDDDD', FALSE);
+INSERT INTO polls (author_id, subject, type, state) VALUES
+    (1, 'Gewichtete Abstimmung', 'Gewichtet', 'Geschlossen'),
+    (1, 'Offene Abstimmung', 'Einfach', 'Offen');
+INSERT INTO choices (poll_id, name) VALUES (1, 'Ja'), (1, 'Nein'), (2, 'Ja'), (2, 'Nein');
+INSERT INTO ballots (choice_id, voter_id) VALUES (1, 1), (2, 2), (3, 2);
+"""
+
+
+@pytest.fixture
+def application(tmp_path):
+    path = tmp_path / "baseline.sqlite"
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+
+    application = create_app(
+        {
+            "TESTING": True,
+            "LOCALE": LOCALE,
+            "DATABASE": str(path),
+            "CODE_CACHE": str(tmp_path / "codes"),
+            "TOKEN_STAMP": str(tmp_path / "tokens.stamp"),
+        }
+    )
+    yield application
+    application.extensions["database"].close()
+
+
+def get_state(database: sqlite3.Connection) -> dict:
+    return {
+        "schema": database.execute(
+            "SELECT type, name, sql FROM sqlite_master ORDER BY type, name"
+        ).fetchall(),
+        "ballots": database.execute(
+            "SELECT poll_id, choice_id, voter_id FROM ballots ORDER BY rowid"
+        ).fetchall(),
+        "tallies": database.execute(
+            "SELECT choice_id, count, weight FROM tallies ORDER BY choice_id"
+        ).fetchall(),
+        "revisions": database.execute(
+            "SELECT name FROM revisions ORDER BY name"
+        ).fetchall(),
+        "voters": database.execute(
+            "SELECT id, name, students, weight FROM voters ORDER BY id"
+        ).fetchall(),
+    }
+
+
+def test_upgrade_baseline_database(application):
+    with application.app_context():
+        database = get_database()
+        upgrade_database(database)
+        state = {key: [tuple(row) for row in rows] for key, rows in get_state(database).items()}
+
+        assert state["ballots"] == [(1, 1, 1), (1, 2, 2), (2, 3, 2)]
+        assert state["tallies"] == [(1, 1, 9), (2, 1, 4), (3, 1, 4), (4, 0, 0)]
+        assert state["revisions"] == [("index",), ("poll:1",), ("poll:2",)]
+        assert state["voters"] == [
+            (1, "Fachschaft A", None, 9), (2, "Fachschaft B", None, 4), (3, "", None, 1)
+        ]
+
+        upgrade_database(database)
+        again = {key: [tuple(row) for row in rows] for key, rows in get_state(database).items()}
+        assert again == state
+
+        database.execute(
+            "INSERT INTO ballots (poll_id, choice_id, voter_id) VALUES (2, 4, 1)"
+        )
+        with pytest.raises(sqlite3.IntegrityError):
+            database.execute(
+                "INSERT INTO ballots (poll_id, choice_id, voter_id) VALUES (2, 3, 1)"
+            )
+        tally = database.execute(
+            "SELECT count, weight FROM tallies WHERE choice_id = 4"
+        ).fetchone()
+        assert tuple(tally) == (1, 9)
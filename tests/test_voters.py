@@ -0,0 +1,44 @@
+import pytest
+
+from vote.benchmark import create_benchmark_app
+from vote.database import get_database
+from vote.voters import get_weight, get_weights
+
+
+@pytest.fixture
+def application(tmp_path):
+    application = create_benchmark_app(str(tmp_path))
+    yield application
+    application.extensions["database"].close()
+
+
+def test_get_weights_matches_get_weight():
+    students = range(1, 20001)
+    assert get_weights(students).tolist() == [get_weight(n) for n in students]
+
+
+def test_update_keeps_weight_of_unknown_student_count(application):
+    with application.app_context():
+        database = get_database()
+        database.execute("UPDATE voters SET students = NULL, weight = 9 WHERE id = 1")
+        database.commit()
+
+    client = application.test_client()
+    client.post("/auth/login/", data={"username": "benchmark", "password": "benchmark"})
+
+    response = client.post("/voters/1/update/", data={"name": "Umbenannt", "students": ""})
+    assert response.status_code == 302
+
+    with application.app_context():
+        voter = get_database().execute(
+            "SELECT name, students, weight FROM voters WHERE id = 1"
+        ).fetchone()
+    assert tuple(voter) == ("Umbenannt", None, 9)
+
+    client.post("/voters/1/update/", data={"name": "Umbenannt", "students": "7000"})
+
+    with application.app_context():
+        voter = get_database().execute(
+            "SELECT students, weight FROM voters WHERE id = 1"
+        ).fetchone()
+    assert tuple(voter) == (7000, get_weight(7000))
@@ -2,8 +2,7 @@ import os
 import locale
 
 from flask import Flask
-
-locale.setlocale(locale.LC_ALL, "de_DE.UTF-8")
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 def create_app(test_config=None) -> Flask:
@@ -11,6 +10,32 @@ def create_app(test_config=None) -> Flask:
     application.config.from_mapping(
         SECRET_KEY="dev",
         DATABASE=os.path.join(application.instance_path, "vote.sqlite"),
+        CODE_CACHE=os.path.join(application.instance_path, "codes"),
+        CODE_BASE_URL=None,
+        TOKEN_STAMP=os.path.join(application.instance_path, "tokens.stamp"),
+        DATABASE_BACKEND="file",
+        DATABASE_POOL_SIZE=8,
+        DATABASE_JOURNAL_MODE="WAL",
+        DATABASE_SYNCHRONOUS="NORMAL",
+        DATABASE_BUSY_TIMEOUT=5000,
+        DATABASE_CACHE_SIZE=-16000,
+        LOCALE="de_DE.UTF-8",
+        PROXY_FIX_X_FOR=0,
+        USER_CACHE_TTL=60,
+        TOKEN_FAILURE_LIMIT=30,
+        TOKEN_FAILURE_WINDOW=60,
+        BALLOT_WRITER="direct",
+        BALLOT_BATCH_SIZE=64,
+        BALLOT_BATCH_WINDOW=0.005,
+        BALLOT_WRITER_TIMEOUT=30,
+        EVENTS_LIFETIME=300,
+        EVENTS_RETRY=3,
+        METRICS=True,
+        METRICS_TOKEN=None,
+        PROFILE="off",
+        PROFILE_SAMPLE_RATE=0.01,
+        PROFILE_THRESHOLD=0.5,
+        PROFILE_DIRECTORY=os.path.join(application.instance_path, "profiles"),
     )
 
     if test_config is None:
@@ -18,19 +43,63 @@ def create_app(test_config=None) -> Flask:
     else:
         application.config.from_mapping(test_config)
 
+    locale.setlocale(locale.LC_ALL, application.config["LOCALE"])
+
+    if application.config["PROXY_FIX_X_FOR"] > 0:
+        application.wsgi_app = ProxyFix(
+            application.wsgi_app, x_for=application.config["PROXY_FIX_X_FOR"]
+        )
+
     try:
         os.makedirs(application.instance_path)
     except OSError:
         pass
 
+    from . import profiling
+
+    profiling.init_application(application)
+
     from . import database
 
     database.init_application(application)
 
+    from . import metrics
+
+    metrics.init_application(application)
+
+    from . import events
+
+    events.init_application(application)
+
+    from . import tokens
+
+    tokens.init_application(application)
+
+    from . import repository
+
+    repository.init_application(application)
+
+    from . import ballots
+
+    ballots.init_application(application)
+
     from . import maintenance
 
     application.cli.add_command(maintenance.create_user)
     application.cli.add_command(maintenance.create_code)
+    application.cli.add_command(maintenance.upgrade_database_command)
+
+    from . import codes
+
+    application.cli.add_command(codes.prune_codes_command)
+
+    from . import results
+
+    application.cli.add_command(results.rebuild_tallies_command)
+
+    from . import snapshots
+
+    application.cli.add_command(snapshots.verify_snapshots_command)
 
     from . import authentication
 
@@ -41,9 +110,27 @@ def create_app(test_config=None) -> Flask:
     application.register_blueprint(polls.blueprint)
     application.add_url_rule("/", endpoint="index")
 
+    application.register_blueprint(metrics.blueprint)
+
+    from . import api
+
+    application.register_blueprint(api.blueprint)
+
+    from . import exports
+
+    application.register_blueprint(exports.blueprint)
+    application.cli.add_command(exports.export_polls_command)
+
     from . import voters
 
     application.register_blueprint(voters.blueprint)
     application.cli.add_command(voters.plot_weight_curve)
+    application.cli.add_command(voters.reweight_command)
+    application.cli.add_command(voters.generate_tokens_command)
+    application.cli.add_command(voters.import_voters_command)
+
+    from . import benchmark
+
+    application.cli.add_command(benchmark.benchmark_command)
 
     return application
@@ -0,0 +1,124 @@
+from flask import Blueprint, jsonify, request, Response
+
+from vote.ballots import check_ballot, submit_ballot
+from vote.codes import evict_codes
+from vote.database import get_database
+from vote.events import publish_poll
+from vote.metrics import get_metrics
+from vote.repository import get_repository
+from vote.revisions import conditional
+from vote.tokens import get_rate_limiter, get_token_index
+
+blueprint = Blueprint("api", __name__, url_prefix="/api")
+
+BATCH_MAX_SIZE = 100
+
+
+def error_response(message: str, status: int) -> tuple[Response, int]:
+    return jsonify({"error": message}), status
+
+
+def read_ballot(item) -> tuple[str, int | None]:
+    if not isinstance(item, dict):
+        return "", None
+
+    token = item.get("token")
+    choice_id = item.get("choice")
+
+    if not isinstance(token, str):
+        token = ""
+    if not isinstance(choice_id, int) or isinstance(choice_id, bool):
+        choice_id = None
+
+    return token.strip(), choice_id
+
+
+@blueprint.route("/polls/<int:poll_id>/")
+@conditional(lambda poll_id: f"poll:{poll_id}")
+def poll(poll_id: int) -> Response | tuple[Response, int]:
+    repository = get_repository()
+    poll = repository.get_poll(poll_id)
+
+    if poll is None:
+        return error_response(f"Poll with ID {poll_id} does not exist.", 404)
+
+    choices = repository.get_choices(poll_id)
+
+    return jsonify(
+        {
+            **{key: poll[key] for key in ("id", "subject", "type", "state")},
+            "choices": [{"id": choice["id"], "name": choice["name"]} for choice in choices],
+        }
+    )
+
+
+@blueprint.route("/polls/<int:poll_id>/ballots/", methods=("POST",))
+def ballots(poll_id: int) -> tuple[Response, int]:
+    client = request.remote_addr or ""
+
+    if get_rate_limiter().is_limited(client):
+        return error_response(
+            "Zu viele ungültige Tokens. Bitte versuche es später erneut.", 429
+        )
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return error_response("Es wird ein JSON-Objekt benötigt.", 400)
+
+    batch = "ballots" in data
+    items = data["ballots"] if batch else [data]
+
+    if not isinstance(items, list) or not items:
+        return error_response("Es wird mindestens eine Stimme benötigt.", 400)
+
+    if len(items) > BATCH_MAX_SIZE:
+        return error_response(
+            f"Es können maximal {BATCH_MAX_SIZE} Stimmen gleichzeitig abgegeben werden.",
+            400,
+        )
+
+    repository = get_repository()
+    poll = repository.get_poll(poll_id)
+
+    if poll is None:
+        return error_response(f"Poll with ID {poll_id} does not exist.", 404)
+
+    if poll["state"] != "Offen":
+        return error_response(f"Poll with ID {poll_id} is not available for voting.", 403)
+
+    choice_ids = [choice["id"] for choice in repository.get_choices(poll_id)]
+
+    ballots = [read_ballot(item) for item in items]
+    errors = [
+        check_ballot(repository, poll["type"], choice_ids, token, choice_id, client)
+        for token, choice_id in ballots
+    ]
+
+    pending = [n for n, error in enumerate(errors) if error is None]
+    if batch and pending:
+        cast = repository.cast_ballots(
+            [(poll_id, ballots[n][1], ballots[n][0]) for n in pending]
+        )
+        for n, error in zip(pending, cast):
+            errors[n] = error
+    elif pending:
+        token, choice_id = ballots[0]
+        errors[0] = submit_ballot(repository, poll_id, choice_id, token)
+
+    accepted = [token for (token, _), error in zip(ballots, errors) if error is None]
+    if accepted:
+        for token in accepted:
+            get_token_index().discard(token)
+        get_metrics().increment("ballots_cast", len(accepted))
+        evict_codes(accepted)
+        publish_poll(get_database(), poll_id)
+
+    results = [
+        {"token": token, "accepted": error is None, "error": error}
+        for (token, _), error in zip(ballots, errors)
+    ]
+
+    if batch:
+        return jsonify({"accepted": len(accepted), "ballots": results}), 200
+
+    return jsonify(results[0]), 201 if accepted else 422
@@ -1,7 +1,9 @@
 import functools
+import sqlite3
+import time
 
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for, Response
+    Blueprint, current_app, flash, g, redirect, render_template, request, session, url_for, Response
 )
 from typing import Any
 from werkzeug.security import check_password_hash
@@ -11,17 +13,45 @@ from vote.database import get_database
 blueprint = Blueprint('auth', __name__, url_prefix="/auth")
 
 
+def get_user_cache() -> dict[int, tuple[float, sqlite3.Row | None]]:
+    return current_app.extensions.setdefault("users", {})
+
+
+def get_user(user_id: int) -> sqlite3.Row | None:
+    cache = get_user_cache()
+    now = time.monotonic()
+
+    cached = cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    database = get_database()
+    user = database.execute(
+        "SELECT * FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    cache[user_id] = (now + current_app.config["USER_CACHE_TTL"], user)
+    return user
+
+
+def invalidate_user(user_id: int | None = None) -> None:
+    cache = get_user_cache()
+    if user_id is None:
+        cache.clear()
+    else:
+        cache.pop(user_id, None)
+
+
 @blueprint.before_app_request
 def load_logged_in_user() -> None:
+    if request.endpoint == "static":
+        g.user = None
+        return
+
     user_id = session.get("user_id")
     if user_id is None:
         g.user = None
     else:
-        database = get_database()
-        user = database.execute(
-            "SELECT * FROM users WHERE id = ?", (user_id,)
-        ).fetchone()
-        g.user = user
+        g.user = get_user(user_id)
 
 
 @blueprint.route("/login/", methods=("GET", "POST"))
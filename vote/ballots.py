@@ -0,0 +1,239 @@
+import concurrent.futures
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, Flask
+from typing import TYPE_CHECKING
+
+from vote.metrics import get_metrics
+from vote.tokens import get_rate_limiter, get_token_index
+
+if TYPE_CHECKING:
+    from vote.repository import Repository
+
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05
+BUSY_ERROR = "Die Abstimmung ist gerade ausgelastet. Bitte versuche es erneut."
+
+Ballot = tuple[int, int, str]
+
+
+def check_ballot(
+    repository: "Repository", poll_type: str, choice_ids: list[int], token: str,
+    choice_id: int | None, client: str,
+) -> str | None:
+    if not token:
+        return "Token wird benötigt."
+
+    if choice_id not in choice_ids:
+        return "Es können nur die zur Auswahl stehenden Optionen gewählt werden."
+
+    entry = get_token_index().lookup(repository, token)
+
+    if entry is None:
+        get_rate_limiter().hit(client)
+        get_metrics().increment("tokens_rejected")
+        return "Der Token ist ungültig."
+
+    _, named = entry
+    return check_token_type(poll_type, named)
+
+
+def check_token_type(poll_type: str, named: bool) -> str | None:
+    if poll_type == "Geheim" and named:
+        return "Es können nur Tokens einer anonymen Transaktionsliste bei dieser Abstimmung verwendet werden."
+
+    if poll_type != "Geheim" and not named:
+        return "Es können nur Tokens einer namentlichen Transaktionsliste bei dieser Abstimmung verwendet werden."
+
+    return None
+
+
+def cast_ballots(
+    database: sqlite3.Connection, ballots: list[Ballot]
+) -> list[str | None]:
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            return _cast_ballots(database, ballots)
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error) and "busy" not in str(error):
+                raise
+            if attempt == LOCK_RETRIES:
+                break
+            get_metrics().increment("lock_retries")
+            time.sleep(LOCK_BACKOFF * 2**attempt * random.uniform(0.5, 1.5))
+
+    return [BUSY_ERROR for _ in ballots]
+
+
+def _cast_ballots(
+    database: sqlite3.Connection, ballots: list[Ballot]
+) -> list[str | None]:
+    if database.in_transaction:
+        database.commit()
+
+    errors = []
+    database.execute("BEGIN IMMEDIATE")
+    try:
+        for poll_id, choice_id, token in ballots:
+            database.execute("SAVEPOINT ballot")
+            error = _claim_token(database, poll_id, choice_id, token)
+            if error is not None:
+                database.execute("ROLLBACK TO ballot")
+            database.execute("RELEASE ballot")
+            errors.append(error)
+    except BaseException:
+        database.rollback()
+        raise
+
+    database.commit()
+    return errors
+
+
+class BallotWriter:
+    def __init__(
+        self, application: Flask, repository: "Repository", batch_size: int, window: float
+    ) -> None:
+        self.application = application
+        self.repository = repository
+        self.batch_size = batch_size
+        self.window = window
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, ballot: Ballot) -> concurrent.futures.Future:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="ballot-writer", daemon=True
+                )
+                self._thread.start()
+
+        future = concurrent.futures.Future()
+        self._queue.put((ballot, future))
+        return future
+
+    def _run(self) -> None:
+        with self.application.app_context():
+            self._write()
+
+    def _write(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            batch = [
+                (ballot, future)
+                for ballot, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                errors = self.repository.cast_ballots([ballot for ballot, _ in batch])
+            except Exception as exception:
+                for _, future in batch:
+                    future.set_exception(exception)
+                continue
+
+            for (_, future), error in zip(batch, errors):
+                future.set_result(error)
+
+
+def submit_ballot(
+    repository: "Repository", poll_id: int, choice_id: int, token: str
+) -> str | None:
+    writer = current_app.extensions.get("ballot_writer")
+    if writer is None:
+        return repository.cast_ballots([(poll_id, choice_id, token)])[0]
+
+    future = writer.submit((poll_id, choice_id, token))
+    try:
+        return future.result(timeout=current_app.config["BALLOT_WRITER_TIMEOUT"])
+    except concurrent.futures.TimeoutError:
+        if future.cancel():
+            return BUSY_ERROR
+        return future.result()
+
+
+def init_application(application: Flask) -> None:
+    if application.config["BALLOT_WRITER"] != "batch":
+        return
+
+    application.extensions["ballot_writer"] = BallotWriter(
+        application,
+        application.extensions["repository"],
+        application.config["BALLOT_BATCH_SIZE"],
+        application.config["BALLOT_BATCH_WINDOW"],
+    )
+
+
+def _claim_token(
+    database: sqlite3.Connection, poll_id: int, choice_id: int, token: str
+) -> str | None:
+    poll = database.execute(
+        "SELECT type, state FROM polls WHERE id = ?",
+        (poll_id,),
+    ).fetchone()
+
+    if poll is None or poll["state"] != "Offen":
+        return "Die Abstimmung ist nicht geöffnet."
+
+    choice = database.execute(
+        "SELECT 1 FROM choices WHERE id = ? AND poll_id = ?",
+        (choice_id, poll_id),
+    ).fetchone()
+
+    if choice is None:
+        return "Es können nur die zur Auswahl stehenden Optionen gewählt werden."
+
+    voter = database.execute(
+        "SELECT voters.id, voters.name FROM tokens"
+        " JOIN voters ON tokens.voter_id = voters.id"
+        " WHERE key = ? AND expired = FALSE",
+        (token,),
+    ).fetchone()
+
+    if voter is None:
+        return "Der Token ist ungültig."
+
+    error = check_token_type(poll["type"], bool(voter["name"]))
+
+    if error is not None:
+        return error
+
+    has_voted = database.execute(
+        "SELECT 1 FROM ballots WHERE poll_id = ? AND voter_id = ?",
+        (poll_id, voter["id"]),
+    ).fetchone()
+
+    if has_voted is not None:
+        return "Du hast bereits an dieser Abstimmung teilgenommen."
+
+    claimed = database.execute(
+        "UPDATE tokens SET expired = TRUE WHERE key = ? AND expired = FALSE",
+        (token,),
+    )
+
+    if claimed.rowcount != 1:
+        return "Der Token ist ungültig."
+
+    database.execute(
+        "INSERT INTO ballots (poll_id, choice_id, voter_id) VALUES (?, ?, ?)",
+        (poll_id, choice_id, voter["id"]),
+    )
+    return None
@@ -0,0 +1,362 @@
+import click
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from datetime import datetime, timezone
+from flask import Flask
+from flask.testing import FlaskClient
+from typing import Callable
+from werkzeug.security import generate_password_hash
+
+from vote import create_app
+from vote.database import DATABASE_BACKENDS, get_database, init_database
+from vote.snapshots import take_snapshot
+from vote.tokens import get_token, get_token_index
+from vote.voters import BASE_DIR, get_weight
+
+POLL_TYPES = ("Einfach", "Namentlich", "Gewichtet", "Geheim")
+POLL_COUNTS = (10, 100, 1000)
+VOTER_COUNT = 50
+BURST_SIZE = 500
+LOCALE = "C.UTF-8"
+HEAVY_MODULES = ("matplotlib", "numpy", "segno")
+STARTUP_SCRIPT = f"""
+import sys
+import time
+
+start = time.perf_counter()
+from vote import create_app
+create_app({{"LOCALE": {LOCALE!r}}})
+print(time.perf_counter() - start)
+print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+
+def summarize(samples: list[float]) -> dict:
+    samples_ms = [sample * 1000 for sample in samples]
+    percentiles = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 4),
+        "p50_ms": round(percentiles[49], 4),
+        "p95_ms": round(percentiles[94], 4),
+        "p99_ms": round(percentiles[98], 4),
+    }
+
+
+def measure(function: Callable, iterations: int) -> dict:
+    samples = []
+    for n in range(iterations):
+        start = time.perf_counter()
+        function(n)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def measure_request(
+    client: FlaskClient, method: str, path: Callable[[int], str], iterations: int,
+    data: Callable[[int], dict] | None = None, headers: dict | None = None,
+    expected: int = 200,
+) -> dict:
+    def request(n: int) -> None:
+        response = client.open(
+            path(n), method=method, data=data(n) if data else None, headers=headers
+        )
+        if response.status_code != expected:
+            raise click.ClickException(
+                f"{method} {path(n)} answered with {response.status_code}, expected {expected}."
+            )
+
+    return measure(request, iterations)
+
+
+def create_benchmark_app(directory: str, **config) -> Flask:
+    application = create_app(
+        {
+            "TESTING": True,
+            "LOCALE": LOCALE,
+            "DATABASE": os.path.join(directory, "benchmark.sqlite"),
+            "CODE_CACHE": os.path.join(directory, "codes"),
+            "TOKEN_STAMP": os.path.join(directory, "tokens.stamp"),
+            **config,
+        }
+    )
+    with application.app_context():
+        init_database()
+        database = get_database()
+        database.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            ("benchmark", generate_password_hash("benchmark")),
+        )
+        database.executemany(
+            "INSERT INTO voters (name, students, weight) VALUES (?, ?, ?)",
+            [
+                (f"Fachschaft {n}", n * 250 + 1, get_weight(n * 250 + 1))
+                for n in range(VOTER_COUNT)
+            ],
+        )
+        database.executemany(
+            "INSERT INTO tokens (voter_id, key) VALUES (?, ?)",
+            [
+                (voter_id, f"B{voter_id:02d}{n:03d}")
+                for voter_id in range(1, VOTER_COUNT + 1)
+                for n in range(30)
+            ],
+        )
+        database.commit()
+    reload_tokens(application)
+    return application
+
+
+def reload_tokens(application: Flask) -> None:
+    with application.app_context():
+        get_token_index().touch()
+
+
+def seed_closed_polls(application: Flask, count: int) -> None:
+    with application.app_context():
+        database = get_database()
+        offset = database.execute("SELECT COUNT(*) FROM polls").fetchone()[0]
+        for n in range(offset, offset + count):
+            cursor = database.execute(
+                "INSERT INTO polls (author_id, subject, type, state)"
+                " VALUES (1, ?, ?, 'Geschlossen')",
+                (f"Benchmark-Abstimmung Nummer {n}", POLL_TYPES[n % len(POLL_TYPES)]),
+            )
+            poll_id = cursor.lastrowid
+            choice_ids = []
+            for name in ("Ja", "Nein", "Enthaltung"):
+                cursor = database.execute(
+                    "INSERT INTO choices (poll_id, name) VALUES (?, ?)",
+                    (poll_id, name),
+                )
+                choice_ids.append(cursor.lastrowid)
+            database.executemany(
+                "INSERT INTO ballots (poll_id, choice_id, voter_id) VALUES (?, ?, ?)",
+                [
+                    (poll_id, choice_ids[(voter_id + n) % 3], voter_id)
+                    for voter_id in range(1, VOTER_COUNT + 1)
+                ],
+            )
+            poll = database.execute(
+                "SELECT id, type FROM polls WHERE id = ?",
+                (poll_id,),
+            ).fetchone()
+            take_snapshot(database, poll)
+        database.commit()
+    reload_tokens(application)
+
+
+def seed_open_poll(application: Flask, iterations: int) -> tuple[int, list[int], int]:
+    with application.app_context():
+        database = get_database()
+        cursor = database.execute(
+            "INSERT INTO polls (author_id, subject, type, state)"
+            " VALUES (1, 'Offene Benchmark-Abstimmung', 'Einfach', 'Offen')"
+        )
+        poll_id = cursor.lastrowid
+        choice_ids = []
+        for name in ("Ja", "Nein", "Enthaltung"):
+            cursor = database.execute(
+                "INSERT INTO choices (poll_id, name) VALUES (?, ?)",
+                (poll_id, name),
+            )
+            choice_ids.append(cursor.lastrowid)
+        first_voter_id = database.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM voters"
+        ).fetchone()[0]
+        database.executemany(
+            "INSERT INTO voters (name, weight) VALUES (?, 1)",
+            [(f"Wähler {n}",) for n in range(iterations)],
+        )
+        database.executemany(
+            "INSERT INTO tokens (voter_id, key) VALUES (?, ?)",
+            [(first_voter_id + n, f"V{n:05d}") for n in range(iterations)],
+        )
+        database.commit()
+    reload_tokens(application)
+    return poll_id, choice_ids, first_voter_id
+
+
+def measure_burst(writer: str, backend: str, size: int = BURST_SIZE) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        application = create_benchmark_app(
+            directory,
+            DATABASE_BACKEND=backend,
+            BALLOT_WRITER=writer,
+            TOKEN_FAILURE_LIMIT=size,
+        )
+        poll_id, choice_ids, _ = seed_open_poll(application, size)
+
+        barrier = threading.Barrier(size + 1)
+        samples = [0.0] * size
+        statuses = [0] * size
+
+        def cast(n: int) -> None:
+            client = application.test_client()
+            barrier.wait()
+            start = time.perf_counter()
+            response = client.post(
+                f"/{poll_id}/vote/",
+                data={"token": f"V{n:05d}", "choice": choice_ids[n % 3]},
+            )
+            samples[n] = time.perf_counter() - start
+            statuses[n] = response.status_code
+
+        threads = [threading.Thread(target=cast, args=(n,)) for n in range(size)]
+        for thread in threads:
+            thread.start()
+
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+
+        application.extensions["database"].close()
+
+    result = summarize(samples)
+    result["ballots_per_second"] = round(size / duration, 1)
+    result["rejected"] = sum(1 for status in statuses if status != 302)
+    return result
+
+
+def run_benchmarks(iterations: int, backend: str = "file") -> dict:
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        application = create_benchmark_app(directory, DATABASE_BACKEND=backend)
+        client = application.test_client()
+        client.post(
+            "/auth/login/", data={"username": "benchmark", "password": "benchmark"}
+        )
+
+        seeded = 0
+        for count in POLL_COUNTS:
+            seed_closed_polls(application, count - seeded)
+            seeded = count
+            results[f"polls.index[{count}]"] = measure_request(
+                client, "GET", lambda n: "/", iterations
+            )
+
+        etag = client.get("/").headers["ETag"]
+        results["polls.index[304]"] = measure_request(
+            client, "GET", lambda n: "/", iterations,
+            headers={"If-None-Match": etag}, expected=304,
+        )
+
+        poll_id, choice_ids, _ = seed_open_poll(application, iterations)
+        results["polls.vote[POST]"] = measure_request(
+            client, "POST", lambda n: f"/{poll_id}/vote/", iterations,
+            data=lambda n: {"token": f"V{n:05d}", "choice": choice_ids[n % 3]},
+            expected=302,
+        )
+
+        results["voters.index"] = measure_request(
+            client, "GET", lambda n: "/voters/", iterations
+        )
+        results["voters.create_tokens[POST]"] = measure_request(
+            client, "POST", lambda n: f"/voters/{n % VOTER_COUNT + 1}/tokens/",
+            iterations, data=lambda n: {"amount": 30}, expected=302,
+        )
+        results["voters.printable"] = measure_request(
+            client, "GET", lambda n: f"/voters/{n % VOTER_COUNT + 1}/tokens/print/",
+            iterations,
+        )
+
+        application.extensions["database"].close()
+
+    for writer in ("direct", "batch"):
+        results[f"polls.vote[burst, {writer}]"] = measure_burst(writer, backend)
+
+    results["get_weight"] = measure(lambda n: get_weight(n * 37 % 20000 + 1), iterations * 100)
+    results["get_token"] = measure(lambda n: get_token(), iterations * 100)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "backend": backend,
+        },
+        "results": results,
+    }
+
+
+def measure_startup(runs: int) -> dict:
+    python_path = [str(BASE_DIR), os.environ.get("PYTHONPATH", "")]
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, python_path)))
+
+    processes, applications = [], []
+    heavy_modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            cwd=BASE_DIR,
+            env=environment,
+            text=True,
+        )
+        processes.append(time.perf_counter() - start)
+
+        if process.returncode != 0:
+            raise click.ClickException(f"Startup failed:\n{process.stderr}")
+
+        output = process.stdout.splitlines()
+        applications.append(float(output[0]))
+        heavy_modules.update(name for name in output[1].split(",") if name)
+
+    return {
+        "process": summarize(processes),
+        "create_app": summarize(applications),
+        "heavy_modules": sorted(heavy_modules),
+    }
+
+
+@click.command("benchmark")
+@click.option("--iterations", default=50, show_default=True, type=click.IntRange(min=2))
+@click.option("--startup-runs", default=10, show_default=True, type=click.IntRange(min=2))
+@click.option(
+    "--startup-budget",
+    default=300.0,
+    show_default=True,
+    help="Maximum p50 milliseconds for importing vote and calling create_app.",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(DATABASE_BACKENDS),
+    default="file",
+    show_default=True,
+    help="Run against a database file or an in-memory database.",
+)
+@click.option("--output", type=click.File("w"), default="-", help="File for the JSON report.")
+def benchmark_command(
+    iterations: int, startup_runs: int, startup_budget: float, backend: str, output
+) -> None:
+    """Benchmark the request handlers against a seeded temporary database."""
+    report = run_benchmarks(iterations, backend)
+    startup = measure_startup(startup_runs)
+    report["results"]["startup"] = startup
+    json.dump(report, output, indent=2)
+    output.write("\n")
+
+    if startup["heavy_modules"]:
+        modules = ", ".join(startup["heavy_modules"])
+        click.echo(click.style(f"Startup imports {modules}.", fg="red"), err=True)
+        exit(1)
+
+    if startup["create_app"]["p50_ms"] > startup_budget:
+        msg = f"Startup takes {startup['create_app']['p50_ms']:.0f} ms, budget is {startup_budget:.0f} ms."
+        click.echo(click.style(msg, fg="red"), err=True)
+        exit(1)
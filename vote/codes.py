@@ -0,0 +1,100 @@
+import click
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import current_app, request
+from markupsafe import Markup
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from vote.repository import get_repository, Repository
+
+
+def get_code_directory() -> Path:
+    return Path(current_app.config["CODE_CACHE"])
+
+
+def get_base_url() -> str:
+    return current_app.config["CODE_BASE_URL"] or request.url_root
+
+
+def get_code_url(token: str, base_url: str) -> str:
+    base = urlsplit(base_url)
+    adapter = current_app.url_map.bind(
+        base.netloc, script_name=base.path or "/", url_scheme=base.scheme
+    )
+    return adapter.build("polls.index", {"token": token}, force_external=True)
+
+
+def get_code(token: str, base_url: str | None = None) -> Markup:
+    url = get_code_url(token, base_url or get_base_url())
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    file = get_code_directory() / token / f"{digest}.svg"
+
+    try:
+        return Markup(file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        pass
+
+    import segno
+
+    svg = segno.make_qr(url).svg_inline(scale=2, omitsize=True, dark="#2E333D")
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=file.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "w", encoding="utf-8") as output:
+        output.write(svg)
+
+    try:
+        os.replace(temporary, file)
+    except OSError:
+        Path(temporary).unlink(missing_ok=True)
+        if not file.exists():
+            raise
+
+    return Markup(svg)
+
+
+def warm_codes(repository: Repository, base_url: str, voter_id: int | None = None) -> None:
+    for sheet in repository.get_sheets(voter_id):
+        for token in sheet["tokens"]:
+            get_code(token["key"], base_url)
+
+
+def warm_codes_later(repository: Repository, voter_id: int | None = None) -> None:
+    application = current_app._get_current_object()
+    base_url = get_base_url()
+
+    def run() -> None:
+        with application.app_context():
+            warm_codes(repository, base_url, voter_id)
+
+    threading.Thread(target=run, name="code-warmer", daemon=True).start()
+
+
+def evict_codes(tokens: Iterable[str]) -> None:
+    directory = get_code_directory()
+    for token in tokens:
+        shutil.rmtree(directory / token, ignore_errors=True)
+
+
+def prune_codes(repository: Repository) -> int:
+    directory = get_code_directory()
+    if not directory.is_dir():
+        return 0
+
+    active = repository.get_active_tokens()
+    expired = [path.name for path in directory.iterdir() if path.name not in active]
+    evict_codes(expired)
+    return len(expired)
+
+
+@click.command("prune-codes")
+def prune_codes_command() -> None:
+    """Remove cached QR codes of expired tokens."""
+    count = prune_codes(get_repository())
+    click.echo(click.style(f"Removed {count} cached codes.", fg="green"))
@@ -1,16 +1,189 @@
 import click
+import queue
 import sqlite3
+import threading
+import time
+import uuid
 
-from flask import current_app, g
+from flask import current_app, g, Flask
 
 
-def get_database() -> sqlite3.Connection:
-    if 'database' not in g:
-        g.database = sqlite3.connect(
-            current_app.config["DATABASE"],
+class QueryStats:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+    def trace(self, statement: str) -> None:
+        self.statements += 1
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def _timed(self, method, *args):
+        stats = self.connection.stats
+        if stats is None:
+            return method(*args)
+
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            stats.seconds += time.perf_counter() - start
+
+    def execute(self, *args):
+        return self._timed(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(super().executemany, *args)
+
+    def executescript(self, *args):
+        return self._timed(super().executescript, *args)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is not None and self.connection.stats is not None:
+            self.connection.stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed(super().fetchmany, *args)
+        if self.connection.stats is not None:
+            self.connection.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self.connection.stats is not None:
+            self.connection.stats.rows += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        if self.connection.stats is not None:
+            self.connection.stats.rows += 1
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    stats: QueryStats | None = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def attach(self, stats: QueryStats | None) -> None:
+        self.stats = stats
+        self.set_trace_callback(stats.trace if stats is not None else None)
+
+
+DATABASE_BACKENDS = ("file", "memory")
+
+
+class ConnectionPool:
+    def __init__(self, config: dict) -> None:
+        backend = config["DATABASE_BACKEND"]
+        if backend not in DATABASE_BACKENDS:
+            raise ValueError(f"DATABASE_BACKEND can only be {DATABASE_BACKENDS}, not {backend!r}.")
+
+        if backend == "memory":
+            self.path = f"file:/vote-{uuid.uuid4().hex}?vfs=memdb"
+        else:
+            self.path = config["DATABASE"]
+        self.pragmas = {
+            "journal_mode": config["DATABASE_JOURNAL_MODE"],
+            "synchronous": config["DATABASE_SYNCHRONOUS"],
+            "busy_timeout": config["DATABASE_BUSY_TIMEOUT"],
+            "cache_size": config["DATABASE_CACHE_SIZE"],
+            "foreign_keys": "ON",
+        }
+        self.factory = InstrumentedConnection if config["METRICS"] else sqlite3.Connection
+        self._idle = queue.LifoQueue(maxsize=config["DATABASE_POOL_SIZE"])
+
+        self._anchor = None
+        if backend == "memory":
+            self._anchor = self.connect()
+            load_schema(self._anchor)
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
             detect_types=sqlite3.PARSE_DECLTYPES,
+            uri=self.path.startswith("file:"),
+            check_same_thread=False,
+            factory=self.factory,
         )
-        g.database.row_factory = sqlite3.Row
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+
+            if is_healthy(connection):
+                return connection
+
+            connection.close()
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put_nowait(connection)
+        except (sqlite3.Error, queue.Full):
+            connection.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+
+def is_healthy(connection: sqlite3.Connection) -> bool:
+    try:
+        connection.execute("SELECT 1").fetchone()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    pool = current_app.extensions.get("database")
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get("database")
+            if pool is None:
+                pool = ConnectionPool(current_app.config)
+                current_app.extensions["database"] = pool
+    return pool
+
+
+def get_database() -> sqlite3.Connection:
+    if 'database' not in g:
+        g.database = get_pool().acquire()
+        if isinstance(g.database, InstrumentedConnection):
+            g.database.attach(g.get("query_stats"))
     return g.database
 
 
@@ -18,16 +191,20 @@ def close_database(e=None) -> None:
     database = g.pop("database", None)
 
     if database is not None:
-        database.close()
-
+        if isinstance(database, InstrumentedConnection):
+            database.attach(None)
+        get_pool().release(database)
 
-def init_database() -> None:
-    database = get_database()
 
+def load_schema(database: sqlite3.Connection) -> None:
     with current_app.open_resource("schema.sql") as file:
         database.executescript(file.read().decode("utf-8"))
 
 
+def init_database() -> None:
+    load_schema(get_database())
+
+
 @click.command("init-db")
 def init_database_command() -> None:
     """Clear the existing data and create new tables."""
@@ -35,6 +212,6 @@ def init_database_command() -> None:
     click.echo("Initialized the database.")
 
 
-def init_application(application) -> None:
+def init_application(application: Flask) -> None:
     application.teardown_appcontext(close_database)
     application.cli.add_command(init_database_command)
@@ -0,0 +1,153 @@
+import json
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+from typing import Iterator
+
+from vote.snapshots import get_snapshot, tally_poll
+
+KEEPALIVE_INTERVAL = 15
+
+
+class Broadcaster:
+    def __init__(self, backlog: int = 16) -> None:
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[queue.Queue]] = {}
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel: str, subscriber: queue.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def has_subscribers(self, *channels: str) -> bool:
+        return any(channel in self._subscribers for channel in channels)
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(message)
+
+
+def get_broadcaster() -> Broadcaster:
+    return current_app.extensions["events"]
+
+
+def format_event(event: str, data: dict | list) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def get_poll_status(database: sqlite3.Connection, poll_id: int) -> dict | None:
+    poll = database.execute(
+        "SELECT id, type, state, created FROM polls WHERE id = ?",
+        (poll_id,),
+    ).fetchone()
+
+    if poll is None:
+        return None
+
+    ballots = database.execute(
+        "SELECT COALESCE(SUM(tallies.count), 0) FROM choices"
+        " JOIN tallies ON tallies.choice_id = choices.id"
+        " WHERE choices.poll_id = ?",
+        (poll_id,),
+    ).fetchone()[0]
+
+    if poll["type"] == "Geheim":
+        eligible = database.execute(
+            "SELECT COUNT(*) FROM voters WHERE name = ''"
+        ).fetchone()[0]
+    else:
+        eligible = database.execute(
+            "SELECT COUNT(*) FROM voters WHERE name != ''"
+        ).fetchone()[0]
+
+    status = {
+        "id": poll["id"],
+        "state": poll["state"],
+        "ballots": ballots,
+        "eligible": eligible,
+    }
+
+    if poll["state"] == "Geschlossen":
+        choices = get_snapshot(database, poll["id"])
+        if choices is None:
+            choices = tally_poll(database, poll)
+        status["results"] = get_status_results(poll, choices)
+
+    return status
+
+
+def get_status_results(poll: sqlite3.Row, choices: list[dict]) -> dict:
+    if poll["type"] == "Namentlich":
+        return {
+            choice["name"]: [voter["name"] for voter in choice["voters"]]
+            for choice in choices
+        }
+
+    column = "weight" if poll["type"] == "Gewichtet" else "count"
+    return {choice["name"]: choice[column] for choice in choices}
+
+
+def publish_poll(database: sqlite3.Connection, poll_id: int) -> None:
+    broadcaster = get_broadcaster()
+    channel = f"poll:{poll_id}"
+
+    if not broadcaster.has_subscribers(channel, "index"):
+        return
+
+    status = get_poll_status(database, poll_id)
+    if status is None:
+        return
+
+    message = format_event("poll", status)
+    broadcaster.publish(channel, message)
+    broadcaster.publish("index", message)
+
+
+def stream_events(
+    broadcaster: Broadcaster, channel: str, initial: list[str],
+    lifetime: float, retry: float,
+) -> Iterator[str]:
+    subscriber = broadcaster.subscribe(channel)
+    deadline = time.monotonic() + lifetime * random.uniform(0.9, 1.1)
+
+    try:
+        yield f"retry: {int(retry * 1000)}\n\n"
+        yield from initial
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                yield subscriber.get(timeout=min(KEEPALIVE_INTERVAL, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(channel, subscriber)
+
+
+def init_application(application) -> None:
+    application.extensions["events"] = Broadcaster()
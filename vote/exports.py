@@ -0,0 +1,171 @@
+import click
+import csv
+import io
+import json
+import sqlite3
+
+from datetime import date, datetime
+from flask import abort, Blueprint, request, stream_with_context, Response
+from typing import Iterable, Iterator
+
+from vote.authentication import login_required
+from vote.database import get_database
+from vote.snapshots import tally_poll
+
+blueprint = Blueprint("exports", __name__, url_prefix="/export")
+
+EXPORT_COLUMNS = (
+    "record", "poll_id", "subject", "type", "created", "choice", "voter", "count", "weight"
+)
+EXPORT_FORMATS = ("csv", "json")
+EXPORT_MIMETYPES = {"csv": "text/csv", "json": "application/json"}
+
+
+def get_export_rows(
+    database: sqlite3.Connection,
+    poll_id: int | None = None,
+    since: date | None = None,
+    until: date | None = None,
+) -> Iterator[tuple]:
+    conditions = ["polls.state = 'Geschlossen'"]
+    parameters = []
+
+    if poll_id is not None:
+        conditions.append("polls.id = ?")
+        parameters.append(poll_id)
+
+    if since is not None:
+        conditions.append("polls.created >= ?")
+        parameters.append(since.isoformat())
+
+    if until is not None:
+        conditions.append("polls.created < date(?, '+1 day')")
+        parameters.append(until.isoformat())
+
+    polls = database.execute(
+        "SELECT polls.id, polls.subject, polls.type, polls.created, snapshots.results"
+        " FROM polls"
+        " LEFT JOIN snapshots ON snapshots.poll_id = polls.id"
+        f" WHERE {' AND '.join(conditions)}"
+        " ORDER BY polls.created, polls.id",
+        parameters,
+    )
+
+    for poll in polls:
+        if poll["results"] is None:
+            choices = tally_poll(database, poll)
+        else:
+            choices = json.loads(poll["results"])
+
+        columns = (poll["id"], poll["subject"], poll["type"], poll["created"])
+        for choice in choices:
+            yield ("result", *columns, choice["name"], None, choice["count"], choice["weight"])
+
+        for choice in choices:
+            for voter in choice.get("voters", ()):
+                yield ("ballot", *columns, choice["name"], voter["name"], None, voter["weight"])
+
+
+def stream_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_json(rows: Iterable[tuple]) -> Iterator[str]:
+    separator = "[\n"
+    for row in rows:
+        yield separator + json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str)
+        separator = ",\n"
+
+    yield "[]\n" if separator == "[\n" else "\n]\n"
+
+
+def stream_export(rows: Iterable[tuple], format_: str) -> Iterator[str]:
+    if format_ == "json":
+        return stream_json(rows)
+    return stream_csv(rows)
+
+
+def export_response(rows: Iterator[tuple], format_: str, name: str) -> Response:
+    return Response(
+        stream_with_context(stream_export(rows, format_)),
+        mimetype=EXPORT_MIMETYPES[format_],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format_}"'},
+    )
+
+
+def parse_date(value: str | None) -> date | None:
+    if not value:
+        return None
+
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, f"Invalid date {value!r}.")
+
+
+@blueprint.route("/")
+@login_required
+def export_polls() -> Response:
+    format_ = request.args.get("format", "csv")
+    if format_ not in EXPORT_FORMATS:
+        abort(400, f"Format can only be {EXPORT_FORMATS}.")
+
+    since = parse_date(request.args.get("from"))
+    until = parse_date(request.args.get("to"))
+
+    rows = get_export_rows(get_database(), since=since, until=until)
+    name = "_".join(["abstimmungen", *(str(day) for day in (since, until) if day)])
+    return export_response(rows, format_, name)
+
+
+@blueprint.route("/<int:poll_id>.<format_>")
+@login_required
+def export_poll(poll_id: int, format_: str) -> Response:
+    if format_ not in EXPORT_FORMATS:
+        abort(404)
+
+    database = get_database()
+    poll = database.execute(
+        "SELECT state FROM polls WHERE id = ?",
+        (poll_id,),
+    ).fetchone()
+
+    if poll is None:
+        abort(404, f"Poll with ID {poll_id} does not exist.")
+
+    if poll["state"] != "Geschlossen":
+        abort(403, f"Poll with ID {poll_id} is not closed yet.")
+
+    return export_response(
+        get_export_rows(database, poll_id=poll_id), format_, f"abstimmung_{poll_id}"
+    )
+
+
+@click.command("export-polls")
+@click.option("--poll", "poll_id", type=int, help="Export a single poll.")
+@click.option("--from", "since", type=click.DateTime(formats=["%Y-%m-%d"]))
+@click.option("--to", "until", type=click.DateTime(formats=["%Y-%m-%d"]))
+@click.option("--format", "format_", type=click.Choice(EXPORT_FORMATS), default="csv", show_default=True)
+@click.option("--output", type=click.File("w"), default="-", help="File for the export.")
+def export_polls_command(
+    poll_id: int | None, since: datetime | None, until: datetime | None, format_: str, output
+) -> None:
+    """Export results and named ballots of closed polls."""
+    rows = get_export_rows(
+        get_database(),
+        poll_id=poll_id,
+        since=since.date() if since else None,
+        until=until.date() if until else None,
+    )
+    for chunk in stream_export(rows, format_):
+        output.write(chunk)
@@ -1,10 +1,12 @@
 import click
+import sqlite3
 import string
-import segno
 
 from werkzeug.security import generate_password_hash
 
-from vote.database import get_database
+from vote.authentication import invalidate_user
+from vote.database import get_database, load_schema
+from vote.results import rebuild_tallies
 from vote.voters import BASE_DIR
 
 
@@ -46,6 +48,7 @@ def create_user(username: str, password: str) -> None:
             (username, generate_password_hash(password)),
         )
         database.commit()
+        invalidate_user()
     except database.IntegrityError:
         click.echo(click.style(f"User '{username}' already exists", fg="red"), err=True)
         exit(1)
@@ -57,6 +60,107 @@ def create_user(username: str, password: str) -> None:
 @click.option("--text", prompt=True)
 @click.option("--name", required=True)
 def create_code(text: str, name: str) -> None:
+    import segno
+
     file = BASE_DIR / "vote" / "static" / f"{name}.png"
     code = segno.make_qr(text)
     code.save(str(file), scale=10, light="#F3F4F6", dark="#2E333D")
+
+
+def get_columns(database: sqlite3.Connection, table: str) -> list[str]:
+    return [column["name"] for column in database.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade_database(database: sqlite3.Connection) -> None:
+    reference = sqlite3.connect(":memory:")
+    reference.row_factory = sqlite3.Row
+    load_schema(reference)
+    schema = reference.execute(
+        "SELECT type, name, sql FROM sqlite_master"
+        " WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+        " ORDER BY rowid"
+    ).fetchall()
+    reference.close()
+
+    existing = {
+        item["name"]: item["sql"]
+        for item in database.execute("SELECT name, sql FROM sqlite_master")
+    }
+    definitions = {item["name"]: item["sql"] for item in schema}
+
+    if database.in_transaction:
+        database.commit()
+
+    database.execute("PRAGMA foreign_keys = OFF")
+    database.execute("BEGIN IMMEDIATE")
+    try:
+        for item in database.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).fetchall():
+            database.execute(f"DROP TRIGGER {item['name']}")
+
+        if "students" not in get_columns(database, "voters"):
+            database.execute("ALTER TABLE voters ADD COLUMN students INTEGER")
+
+        ballots = existing["ballots"]
+        if (
+            "poll_id" not in get_columns(database, "ballots")
+            or "unique_ballot" in ballots
+            or "REFERENCES tokens" in ballots
+        ):
+            database.execute(
+                definitions["ballots"].replace("ballots", "ballots_upgrade", 1)
+            )
+            database.execute(
+                "INSERT INTO ballots_upgrade (poll_id, choice_id, voter_id, created)"
+                " SELECT choices.poll_id, ballots.choice_id, ballots.voter_id, ballots.created"
+                " FROM ballots"
+                " JOIN choices ON ballots.choice_id = choices.id"
+            )
+            database.execute("DROP TABLE ballots")
+            database.execute("ALTER TABLE ballots_upgrade RENAME TO ballots")
+
+        for item in schema:
+            if item["type"] == "table" and item["name"] not in existing:
+                database.execute(item["sql"])
+
+        for item in schema:
+            if item["type"] == "index":
+                database.execute(
+                    item["sql"].replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)
+                )
+
+        database.execute("INSERT OR IGNORE INTO revisions (name) VALUES ('index')")
+        database.execute(
+            "INSERT OR IGNORE INTO revisions (name) SELECT 'poll:' || id FROM polls"
+        )
+
+        for item in schema:
+            if item["type"] == "trigger":
+                database.execute(item["sql"])
+
+        violations = database.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise sqlite3.IntegrityError(
+                f"{len(violations)} rows violate a foreign key,"
+                f" first in table {violations[0]['table']}."
+            )
+
+        rebuild_tallies(database)
+    except BaseException:
+        database.rollback()
+        raise
+    finally:
+        database.execute("PRAGMA foreign_keys = ON")
+
+
+@click.command("upgrade-db")
+def upgrade_database_command() -> None:
+    """Migrate an existing database to the current schema without losing data."""
+    try:
+        upgrade_database(get_database())
+    except sqlite3.IntegrityError as error:
+        click.echo(click.style(f"Upgrade failed: {error}", fg="red"), err=True)
+        exit(1)
+
+    click.echo(click.style("Database upgraded.", fg="green"))
@@ -0,0 +1,132 @@
+import bisect
+import hmac
+import threading
+import time
+
+from flask import abort, Blueprint, current_app, g, request, Flask, Response
+
+from vote.database import QueryStats
+
+blueprint = Blueprint("metrics", __name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = {
+    "ballots_cast": "Ballots accepted.",
+    "tokens_rejected": "Ballots rejected because of an unknown token.",
+    "lock_retries": "Ballot transactions retried after a locked database.",
+}
+
+
+class EndpointMetrics:
+    def __init__(self) -> None:
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.requests = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, endpoint: str, seconds: float, stats: QueryStats) -> None:
+        with self._lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics()
+
+            bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if bucket < len(LATENCY_BUCKETS):
+                metrics.buckets[bucket] += 1
+            metrics.requests += 1
+            metrics.seconds += seconds
+            metrics.statements += stats.statements
+            metrics.sql_seconds += stats.seconds
+            metrics.rows += stats.rows
+
+    def render(self) -> str:
+        lines = []
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+            lines.append("# HELP vote_request_duration_seconds Request latency per endpoint.")
+            lines.append("# TYPE vote_request_duration_seconds histogram")
+            for endpoint, metrics in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(
+                        f'vote_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'vote_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {metrics.requests}'
+                )
+                lines.append(f'vote_request_duration_seconds_sum{{endpoint="{endpoint}"}} {metrics.seconds}')
+                lines.append(f'vote_request_duration_seconds_count{{endpoint="{endpoint}"}} {metrics.requests}')
+
+            for name, attribute, description in (
+                ("vote_sql_statements_total", "statements", "SQL statements executed per endpoint."),
+                ("vote_sql_seconds_total", "sql_seconds", "Time spent in SQL per endpoint."),
+                ("vote_sql_rows_total", "rows", "Rows fetched per endpoint."),
+            ):
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for endpoint, metrics in endpoints:
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {getattr(metrics, attribute)}')
+
+            for counter, description in COUNTERS.items():
+                lines.append(f"# HELP vote_{counter}_total {description}")
+                lines.append(f"# TYPE vote_{counter}_total counter")
+                lines.append(f"vote_{counter}_total {self.counters[counter]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics() -> Metrics:
+    return current_app.extensions["metrics"]
+
+
+def start_request() -> None:
+    g.request_start = time.perf_counter()
+    g.query_stats = QueryStats()
+
+
+def finish_request(e=None) -> None:
+    start = g.pop("request_start", None)
+    stats = g.pop("query_stats", None)
+
+    if start is None or request.endpoint in (None, "static"):
+        return
+
+    get_metrics().observe(request.endpoint, time.perf_counter() - start, stats)
+
+
+@blueprint.route("/metrics")
+def metrics() -> Response:
+    token = current_app.config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+
+    authorized = g.user is not None or (
+        token is not None and hmac.compare_digest(authorization, f"Bearer {token}")
+    )
+    if not authorized:
+        abort(401)
+
+    return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_application(application: Flask) -> None:
+    application.extensions["metrics"] = Metrics()
+
+    if application.config["METRICS"]:
+        application.before_request(start_request)
+        application.teardown_request(finish_request)
@@ -1,5 +1,6 @@
 from flask import (
     Blueprint,
+    current_app,
     flash,
     g,
     redirect,
@@ -12,62 +13,111 @@ from werkzeug.exceptions import abort
 
 from vote import database
 from vote.authentication import login_required
+from vote.ballots import check_ballot, submit_ballot
+from vote.codes import evict_codes
 from vote.database import get_database
+from vote.events import (
+    format_event,
+    get_broadcaster,
+    get_poll_status,
+    publish_poll,
+    stream_events,
+)
+from vote.metrics import get_metrics
+from vote.repository import get_repository
+from vote.revisions import conditional
+from vote.tokens import get_rate_limiter, get_token_index
 
 blueprint = Blueprint("polls", __name__)
 
+POLL_STATES = ("Vorbereitet", "Offen", "Geschlossen", "Gelöscht")
+POLL_TYPES = ("Einfach", "Namentlich", "Gewichtet", "Geheim")
+POLLS_PER_PAGE = 20
+
 
 @blueprint.route("/")
+@conditional(lambda: "index")
 def index() -> str:
+    state = request.args.get("state")
+    type_ = request.args.get("type")
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+
+    if state not in POLL_STATES:
+        state = None
+
+    if type_ not in POLL_TYPES:
+        type_ = None
+
+    repository = get_repository()
+    polls = repository.list_polls(state, type_, after, before, POLLS_PER_PAGE + 1)
+
+    has_more = len(polls) > POLLS_PER_PAGE
+    polls = polls[:POLLS_PER_PAGE]
+    if before is not None:
+        polls.reverse()
+
+    newer = older = None
+    if polls:
+        if after is not None or (before is not None and has_more):
+            newer = polls[0]["id"]
+        if before is not None or has_more:
+            older = polls[-1]["id"]
+
+    fragments = repository.get_fragments(polls)
+
+    return render_template(
+        "polls/index.html",
+        polls=polls,
+        fragments=fragments,
+        token=request.args.get("token"),
+        live=request.args.get("live") == "1",
+        filters={"state": state, "type": type_},
+        states=POLL_STATES,
+        types=POLL_TYPES,
+        newer=newer,
+        older=older,
+    )
+
+
+@blueprint.route("/events/")
+def index_events() -> Response:
     database = get_database()
-    polls = database.execute(
-        "SELECT polls.id, subject, author_id, created, state, type, username"
-        " FROM polls"
-        " JOIN users ON polls.author_id = users.id"
-        " ORDER BY created DESC"
-    ).fetchall()
-
-    results = {}
-    for poll in polls:
-        poll_id = poll["id"]
-        if poll["type"] == "Namentlich":
-            data = database.execute(
-                "SELECT choices.name, voters.name"
-                " FROM ballots"
-                " RIGHT JOIN choices ON ballots.choice_id = choices.id"
-                " LEFT JOIN voters ON ballots.voter_id = voters.id"
-                " WHERE choices.poll_id = ?",
-                (poll_id,),
-            ).fetchall()
-            result = {}
-            for item in data:
-                choice_name = item[0]
-                voter_name = item[1]
-                if choice_name not in result.keys():
-                    result[choice_name] = []
-                result[choice_name].append(voter_name)
-        elif poll["type"] == "Gewichtet":
-            result = database.execute(
-                "SELECT choices.name, SUM(voters.weight) as count"
-                " FROM ballots"
-                " RIGHT JOIN choices ON ballots.choice_id = choices.id"
-                " LEFT JOIN voters ON ballots.voter_id = voters.id"
-                " WHERE choices.poll_id = ?"
-                " GROUP BY choices.name",
-                (poll_id,),
-            ).fetchall()
-        else:
-            result = database.execute(
-                "SELECT choices.name, COUNT(ballots.voter_id) AS count"
-                " FROM ballots"
-                " RIGHT JOIN choices ON ballots.choice_id = choices.id"
-                " WHERE choices.poll_id = ?"
-                " GROUP BY choices.name",
-                (poll_id,),
-            ).fetchall()
-        results[poll_id] = result
+    polls = database.execute("SELECT id FROM polls WHERE state = 'Offen'").fetchall()
+    initial = [format_event("polls", [poll["id"] for poll in polls])]
+    initial += [format_event("poll", get_poll_status(database, poll["id"])) for poll in polls]
+    return Response(
+        stream_events(
+            get_broadcaster(),
+            "index",
+            initial,
+            current_app.config["EVENTS_LIFETIME"],
+            current_app.config["EVENTS_RETRY"],
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@blueprint.route("/<int:poll_id>/events/")
+def poll_events(poll_id: int) -> Response:
+    database = get_database()
+    status = get_poll_status(database, poll_id)
 
-    return render_template("polls/index.html", polls=polls, results=results)
+    if status is None:
+        abort(404, f"Poll with ID {poll_id} does not exist.")
+
+    return Response(
+        stream_events(
+            get_broadcaster(),
+            f"poll:{poll_id}",
+            [format_event("poll", status)],
+            current_app.config["EVENTS_LIFETIME"],
+            current_app.config["EVENTS_RETRY"],
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @blueprint.route("/create/", methods=("GET", "POST"))
@@ -77,7 +127,7 @@ def create() -> str | Response:
     subject_max_length = 250
     choices_min_count = 3
     choice_max_length = 50
-    type_choices = ("Einfach", "Namentlich", "Gewichtet", "Geheim")
+    type_choices = POLL_TYPES
 
     if request.method == "POST":
         subject = request.form["subject"].strip()
@@ -113,18 +163,8 @@ def create() -> str | Response:
         if error is not None:
             flash(error)
         else:
-            database = get_database()
-            cursor = database.cursor()
-            cursor.execute(
-                "INSERT INTO polls (subject, author_id, type) VALUES (?, ?, ?)",
-                (subject, g.user["id"], type_),
-            )
-            poll_id = cursor.lastrowid
-            cursor.executemany(
-                "INSERT INTO choices (poll_id, name) VALUES (?, ?)",
-                [(poll_id, choice) for choice in choices],
-            )
-            database.commit()
+            poll_id = get_repository().create_poll(g.user, subject, type_, choices)
+            publish_poll(get_database(), poll_id)
             return redirect(url_for("polls.index"))
 
     validation = {
@@ -138,13 +178,10 @@ def create() -> str | Response:
 @blueprint.route("/<int:poll_id>/state/", methods=("GET", "POST"))
 @login_required
 def state(poll_id: int) -> str | Response:
-    state_choices = ("Vorbereitet", "Offen", "Geschlossen", "Gelöscht")
+    state_choices = POLL_STATES
 
-    database = get_database()
-    poll = database.execute(
-        "SELECT * FROM polls WHERE polls.id = ?",
-        (poll_id,),
-    ).fetchone()
+    repository = get_repository()
+    poll = repository.get_poll(poll_id)
 
     if poll is None:
         abort(404, f"Poll with ID {poll_id} does not exist.")
@@ -183,24 +220,24 @@ def state(poll_id: int) -> str | Response:
         if error is not None:
             flash(error)
         else:
-            database.execute(
-                "UPDATE polls SET state = ? WHERE polls.id = ?",
-                (state, poll_id),
-            )
-            database.commit()
+            repository.set_poll_state(poll, state)
+            publish_poll(get_database(), poll_id)
             return redirect(url_for("polls.index"))
 
     return render_template("polls/state.html", poll=poll, states=state_choices)
 
 
 @blueprint.route("/<int:poll_id>/vote/", methods=("GET", "POST"))
+@conditional(lambda poll_id: f"poll:{poll_id}")
 def vote(poll_id: int) -> str | Response:
-    database = get_database()
+    client = request.remote_addr or ""
+
+    if request.method == "POST" and get_rate_limiter().is_limited(client):
+        abort(429, "Zu viele ungültige Tokens. Bitte versuche es später erneut.")
+
+    repository = get_repository()
 
-    poll = database.execute(
-        "SELECT * FROM polls WHERE polls.id = ?",
-        (poll_id,),
-    ).fetchone()
+    poll = repository.get_poll(poll_id)
 
     if poll is None:
         abort(404, f"Poll with ID {poll_id} does not exist.")
@@ -208,72 +245,31 @@ def vote(poll_id: int) -> str | Response:
     if poll["state"] != "Offen":
         abort(403, f"Poll with ID {poll_id} is not available for voting.")
 
-    choices = database.execute(
-        "SELECT * FROM choices WHERE poll_id = ?",
-        (poll_id,),
-    ).fetchall()
+    choices = repository.get_choices(poll_id)
 
     if request.method == "POST":
-        token_id = request.form["token"]
-        choice_id = int(request.form["choice"])
+        token = request.form.get("token", "").strip()
+        choice_id = request.form.get("choice", type=int)
 
-        error = None
-
-        if not token_id:
-            error = "Token wird benötigt."
-
-        data = database.execute(
-            "SELECT expired, voters.id, name FROM tokens"
-            " JOIN voters ON tokens.voter_id = voters.id WHERE key = ?",
-            (token_id,),
-        ).fetchone()
-
-        if data is None:
-            is_expired = True
-        else:
-            voter = {
-                "id": data["id"],
-                "name": data["name"],
-            }
-
-            if poll["type"] == "Geheim" and voter["name"]:
-                error = "Es können nur Tokens einer anonymen Transaktionsliste bei dieser Abstimmung verwendet werden."
-
-            if poll["type"] != "Geheim" and not voter["name"]:
-                error = "Es können nur Tokens einer namentlichen Transaktionsliste bei dieser Abstimmung verwendet werden."
+        error = check_ballot(
+            repository,
+            poll["type"],
+            [choice["id"] for choice in choices],
+            token,
+            choice_id,
+            client,
+        )
 
-            is_expired = data["expired"]
-
-            ballots = database.execute(
-                "SELECT ballots.voter_id FROM polls"
-                " JOIN choices ON choices.poll_id = polls.id"
-                " JOIN ballots ON ballots.choice_id = choices.id"
-                " WHERE polls.id = ?",
-                (poll_id,),
-            ).fetchall()
-            voters_id = [ballot["voter_id"] for ballot in ballots]
-
-            if voter["id"] in voters_id:
-                error = "Du hast bereits an dieser Abstimmung teilgenommen."
-
-        if is_expired:
-            error = "Der Token ist ungültig."
-
-        if choice_id not in [choice["id"] for choice in choices]:
-            error = "Es können nur die zur Auswahl stehenden Optionen gewählt werden."
+        if error is None:
+            error = submit_ballot(repository, poll_id, choice_id, token)
 
         if error is not None:
             flash(error)
         else:
-            database.execute(
-                "INSERT INTO ballots (choice_id, voter_id) VALUES (?, ?)",
-                (choice_id, voter["id"]),
-            )
-            database.execute(
-                "UPDATE tokens SET expired = TRUE WHERE key = ?",
-                (token_id,),
-            )
-            database.commit()
+            get_token_index().discard(token)
+            get_metrics().increment("ballots_cast")
+            evict_codes([token])
+            publish_poll(get_database(), poll_id)
             flash("Stimme wurde erfolgreich abgegeben.")
             return redirect(url_for("polls.index"))
 
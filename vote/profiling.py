@@ -0,0 +1,112 @@
+import click
+import io
+import random
+import threading
+import time
+
+from datetime import datetime
+from flask import current_app, g, request, Flask
+from pathlib import Path
+
+PROFILE_MODES = ("off", "sample", "slow")
+
+_profile_lock = threading.Lock()
+
+
+def get_profile_directory() -> Path:
+    return Path(current_app.config["PROFILE_DIRECTORY"])
+
+
+def start_profile() -> None:
+    if request.endpoint == "static":
+        return
+
+    config = current_app.config
+    if config["PROFILE"] == "sample" and random.random() >= config["PROFILE_SAMPLE_RATE"]:
+        return
+
+    if not _profile_lock.acquire(blocking=False):
+        return
+
+    import cProfile
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        _profile_lock.release()
+        return
+
+    g.profile = profile
+    g.profile_start = time.perf_counter()
+
+
+def finish_profile(e=None) -> None:
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+
+    profile.disable()
+    _profile_lock.release()
+    seconds = time.perf_counter() - g.pop("profile_start")
+
+    if current_app.config["PROFILE"] == "slow" and seconds < current_app.config["PROFILE_THRESHOLD"]:
+        return
+
+    directory = get_profile_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    endpoint = request.endpoint or "unknown"
+    created = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    profile.dump_stats(directory / f"{endpoint}_{created}_{seconds * 1000:.0f}ms.prof")
+
+
+@click.command("profiles")
+@click.option("--endpoint", help="Only include profiles of this endpoint.")
+@click.option("--top", default=20, show_default=True, help="Number of functions to summarize.")
+@click.option(
+    "--sort",
+    type=click.Choice(("cumulative", "tottime", "calls")),
+    default="cumulative",
+    show_default=True,
+)
+def profiles_command(endpoint: str | None, top: int, sort: str) -> None:
+    """List captured request profiles and summarize their top functions."""
+    directory = get_profile_directory()
+    files = sorted(
+        directory.glob("*.prof") if directory.is_dir() else [],
+        key=lambda file: file.stem.rsplit("_", 2)[1],
+    )
+
+    if endpoint is not None:
+        files = [file for file in files if file.stem.rsplit("_", 2)[0] == endpoint]
+
+    if not files:
+        click.echo(click.style("No profiles captured.", fg="red"), err=True)
+        exit(1)
+
+    for file in files:
+        name, created, duration = file.stem.rsplit("_", 2)
+        created = datetime.strptime(created, "%Y%m%dT%H%M%S%f")
+        click.echo(f"{created:%Y-%m-%d %H:%M:%S}  {duration:>8}  {name}  {file.name}")
+
+    import pstats
+
+    stream = io.StringIO()
+    stats = pstats.Stats(*map(str, files), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    click.echo(stream.getvalue())
+
+
+def init_application(application: Flask) -> None:
+    application.cli.add_command(profiles_command)
+
+    mode = application.config["PROFILE"]
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"PROFILE can only be {PROFILE_MODES}, not {mode!r}.")
+
+    if mode == "off":
+        return
+
+    application.before_request(start_profile)
+    application.teardown_request(finish_profile)
@@ -0,0 +1,265 @@
+import itertools
+import os
+import sqlite3
+
+from flask import current_app, Flask
+from markupsafe import Markup
+from typing import Any, Iterator, Mapping, Protocol
+
+from vote.ballots import Ballot, cast_ballots
+from vote.database import get_database
+from vote.snapshots import get_fragments, take_snapshot, tally_poll
+from vote.tokens import get_token, get_token_index
+
+Row = Mapping[str, Any]
+
+
+class Repository(Protocol):
+    def get_revision(self, name: str) -> Row | None: ...
+
+    def list_polls(
+        self, state: str | None, type_: str | None,
+        after: int | None, before: int | None, limit: int,
+    ) -> list[Row]: ...
+
+    def get_fragments(self, polls: list[Row]) -> dict[int, Markup]: ...
+
+    def get_poll(self, poll_id: int) -> Row | None: ...
+
+    def get_choices(self, poll_id: int) -> list[Row]: ...
+
+    def create_poll(self, author: Row, subject: str, type_: str, choices: list[str]) -> int: ...
+
+    def set_poll_state(self, poll: Row, state: str) -> None: ...
+
+    def tally_poll(self, poll: Row) -> list[dict]: ...
+
+    def cast_ballots(self, ballots: list[Ballot]) -> list[str | None]: ...
+
+    def load_tokens(self) -> dict[str, tuple[int, bool]]: ...
+
+    def get_active_tokens(self) -> set[str]: ...
+
+    def get_voter(self, voter_id: int) -> Row | None: ...
+
+    def count_tokens(self, voter_id: int) -> int: ...
+
+    def get_token_voter_ids(self, missing_only: bool = False) -> list[int]: ...
+
+    def generate_tokens(self, voter_ids: list[int], amount: int) -> int: ...
+
+    def get_sheets(self, voter_id: int | None = None) -> Iterator[dict]: ...
+
+
+class SQLiteRepository:
+    def get_revision(self, name: str) -> sqlite3.Row | None:
+        return get_database().execute(
+            "SELECT name, revision, modified FROM revisions WHERE name = ?",
+            (name,),
+        ).fetchone()
+
+    def list_polls(
+        self, state: str | None, type_: str | None,
+        after: int | None, before: int | None, limit: int,
+    ) -> list[sqlite3.Row]:
+        conditions, parameters = [], []
+
+        if state is not None:
+            conditions.append("polls.state = ?")
+            parameters.append(state)
+        else:
+            conditions.append("polls.state != 'Gelöscht'")
+
+        if type_ is not None:
+            conditions.append("polls.type = ?")
+            parameters.append(type_)
+
+        order = "DESC"
+        if after is not None:
+            conditions.append(
+                "(polls.created, polls.id) < (SELECT created, id FROM polls WHERE id = ?)"
+            )
+            parameters.append(after)
+        elif before is not None:
+            conditions.append(
+                "(polls.created, polls.id) > (SELECT created, id FROM polls WHERE id = ?)"
+            )
+            parameters.append(before)
+            order = "ASC"
+
+        return get_database().execute(
+            "SELECT polls.id, subject, author_id, created, state, type, username"
+            " FROM polls"
+            " JOIN users ON polls.author_id = users.id"
+            f" WHERE {' AND '.join(conditions)}"
+            f" ORDER BY polls.created {order}, polls.id {order}"
+            " LIMIT ?",
+            (*parameters, limit),
+        ).fetchall()
+
+    def get_fragments(self, polls: list[sqlite3.Row]) -> dict[int, Markup]:
+        return get_fragments(get_database(), polls)
+
+    def get_poll(self, poll_id: int) -> sqlite3.Row | None:
+        return get_database().execute(
+            "SELECT * FROM polls WHERE polls.id = ?",
+            (poll_id,),
+        ).fetchone()
+
+    def get_choices(self, poll_id: int) -> list[sqlite3.Row]:
+        return get_database().execute(
+            "SELECT * FROM choices WHERE poll_id = ?",
+            (poll_id,),
+        ).fetchall()
+
+    def create_poll(self, author: Row, subject: str, type_: str, choices: list[str]) -> int:
+        database = get_database()
+        cursor = database.cursor()
+        cursor.execute(
+            "INSERT INTO polls (subject, author_id, type) VALUES (?, ?, ?)",
+            (subject, author["id"], type_),
+        )
+        poll_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO choices (poll_id, name) VALUES (?, ?)",
+            [(poll_id, choice) for choice in choices],
+        )
+        database.commit()
+        return poll_id
+
+    def set_poll_state(self, poll: sqlite3.Row, state: str) -> None:
+        database = get_database()
+        database.execute(
+            "UPDATE polls SET state = ? WHERE polls.id = ?",
+            (state, poll["id"]),
+        )
+        if state == "Geschlossen":
+            take_snapshot(database, poll)
+        database.commit()
+
+    def tally_poll(self, poll: Row) -> list[dict]:
+        return tally_poll(get_database(), poll)
+
+    def cast_ballots(self, ballots: list[Ballot]) -> list[str | None]:
+        return cast_ballots(get_database(), ballots)
+
+    def load_tokens(self) -> dict[str, tuple[int, bool]]:
+        data = get_database().execute(
+            "SELECT tokens.key, tokens.voter_id, voters.name != '' AS named FROM tokens"
+            " JOIN voters ON tokens.voter_id = voters.id"
+            " WHERE expired = FALSE"
+        ).fetchall()
+        return {item["key"]: (item["voter_id"], bool(item["named"])) for item in data}
+
+    def get_active_tokens(self) -> set[str]:
+        return {
+            item["key"]
+            for item in get_database().execute(
+                "SELECT key FROM tokens WHERE expired = FALSE"
+            )
+        }
+
+    def get_voter(self, voter_id: int) -> sqlite3.Row | None:
+        return get_database().execute(
+            "SELECT * FROM voters WHERE id = ?",
+            (voter_id,),
+        ).fetchone()
+
+    def count_tokens(self, voter_id: int) -> int:
+        return get_database().execute(
+            "SELECT COUNT(key) FROM tokens WHERE voter_id = ? AND expired = FALSE",
+            (voter_id,),
+        ).fetchone()[0]
+
+    def get_token_voter_ids(self, missing_only: bool = False) -> list[int]:
+        database = get_database()
+        if missing_only:
+            data = database.execute(
+                "SELECT id FROM voters WHERE NOT EXISTS"
+                " (SELECT 1 FROM tokens WHERE tokens.voter_id = voters.id AND expired = FALSE)"
+                " ORDER BY id"
+            ).fetchall()
+        else:
+            data = database.execute("SELECT id FROM voters ORDER BY id").fetchall()
+        return [item["id"] for item in data]
+
+    def generate_tokens(self, voter_ids: list[int], amount: int) -> int:
+        database = get_database()
+        database.executemany(
+            "UPDATE tokens SET expired = TRUE WHERE voter_id = ? AND expired = FALSE",
+            [(voter_id,) for voter_id in voter_ids],
+        )
+        created = database.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+
+        generated = 0
+        for voter_id in voter_ids:
+            missing = amount
+            attempts = 0
+            while missing > 0:
+                if attempts > 20:
+                    database.rollback()
+                    raise RuntimeError("Failed to generate token set.")
+                cursor = database.executemany(
+                    "INSERT OR IGNORE INTO tokens (voter_id, key, created) VALUES (?, ?, ?)",
+                    [(voter_id, get_token(), created) for n in range(missing)],
+                )
+                missing -= cursor.rowcount
+                generated += cursor.rowcount
+                attempts += 1
+
+        database.commit()
+        return generated
+
+    def get_sheets(self, voter_id: int | None = None) -> Iterator[dict]:
+        condition, parameters = "", []
+        if voter_id is not None:
+            condition = "  WHERE voter_id = ?"
+            parameters.append(voter_id)
+
+        cursor = get_database().execute(
+            "SELECT voters.id, voters.name, voters.weight, tokens.key, tokens.expired,"
+            " tokens.created"
+            " FROM tokens"
+            " JOIN ("
+            "  SELECT voter_id, MAX(created) AS created FROM tokens"
+            f"{condition}"
+            "  GROUP BY voter_id"
+            " ) AS latest ON latest.voter_id = tokens.voter_id AND latest.created = tokens.created"
+            " JOIN voters ON voters.id = tokens.voter_id"
+            " ORDER BY voters.id, tokens.rowid",
+            parameters,
+        )
+
+        for _, rows in itertools.groupby(cursor, key=lambda row: row["id"]):
+            yield get_sheet(list(rows))
+
+
+def get_sheet(tokens: list[Row]) -> dict:
+    first = tokens[0]
+    return {
+        "voter": {
+            "id": first["id"],
+            "name": first["name"] or "Anonym",
+            "weight": first["weight"],
+        },
+        "created": first["created"],
+        "tokens": tokens,
+    }
+
+
+def get_repository() -> Repository:
+    return current_app.extensions["repository"]
+
+
+def init_application(application: Flask) -> None:
+    repository = SQLiteRepository()
+    application.extensions["repository"] = repository
+
+    if not os.path.exists(application.config["DATABASE"]):
+        return
+
+    with application.app_context():
+        try:
+            get_token_index().load(repository)
+        except sqlite3.Error:
+            pass
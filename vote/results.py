@@ -0,0 +1,147 @@
+import click
+import sqlite3
+
+from typing import Any
+
+from vote.database import get_database
+
+
+def get_results(database: sqlite3.Connection, polls: list[sqlite3.Row]) -> dict[int, Any]:
+    named, weighted, counted = [], [], []
+    for poll in polls:
+        if poll["type"] == "Namentlich":
+            named.append(poll["id"])
+        elif poll["type"] == "Gewichtet":
+            weighted.append(poll["id"])
+        else:
+            counted.append(poll["id"])
+
+    results = {}
+
+    if named:
+        results.update(get_named_results(database, named))
+
+    if weighted:
+        results.update(get_weighted_results(database, weighted))
+
+    if counted:
+        results.update(get_counted_results(database, counted))
+
+    return results
+
+
+def _placeholders(ids: list[int]) -> str:
+    return ", ".join("?" for _ in ids)
+
+
+def get_named_results(
+    database: sqlite3.Connection, poll_ids: list[int]
+) -> dict[int, dict[str, list[str | None]]]:
+    data = database.execute(
+        "SELECT choices.poll_id, choices.name, voters.name"
+        " FROM choices"
+        " LEFT JOIN ballots"
+        " ON ballots.poll_id = choices.poll_id AND ballots.choice_id = choices.id"
+        " LEFT JOIN voters ON ballots.voter_id = voters.id"
+        f" WHERE choices.poll_id IN ({_placeholders(poll_ids)})"
+        " ORDER BY choices.id",
+        poll_ids,
+    ).fetchall()
+
+    results = {poll_id: {} for poll_id in poll_ids}
+    for item in data:
+        poll_id, choice_name, voter_name = item[0], item[1], item[2]
+        results[poll_id].setdefault(choice_name, []).append(voter_name)
+    return results
+
+
+def get_weighted_results(
+    database: sqlite3.Connection, poll_ids: list[int]
+) -> dict[int, list[sqlite3.Row]]:
+    return _get_tallies(database, poll_ids, "weight")
+
+
+def get_counted_results(
+    database: sqlite3.Connection, poll_ids: list[int]
+) -> dict[int, list[sqlite3.Row]]:
+    return _get_tallies(database, poll_ids, "count")
+
+
+def _get_tallies(
+    database: sqlite3.Connection, poll_ids: list[int], column: str
+) -> dict[int, list[sqlite3.Row]]:
+    data = database.execute(
+        f"SELECT choices.poll_id, choices.name, SUM(tallies.{column}) AS count"
+        " FROM choices"
+        " JOIN tallies ON tallies.choice_id = choices.id"
+        f" WHERE choices.poll_id IN ({_placeholders(poll_ids)})"
+        " GROUP BY choices.poll_id, choices.name"
+        " ORDER BY choices.poll_id, choices.name",
+        poll_ids,
+    ).fetchall()
+    return _group_by_poll(data, poll_ids)
+
+
+def _group_by_poll(
+    data: list[sqlite3.Row], poll_ids: list[int]
+) -> dict[int, list[sqlite3.Row]]:
+    results = {poll_id: [] for poll_id in poll_ids}
+    for item in data:
+        results[item["poll_id"]].append(item)
+    return results
+
+
+def find_tally_drift(database: sqlite3.Connection) -> list[sqlite3.Row]:
+    return database.execute(
+        "SELECT choices.id AS choice_id,"
+        " tallies.count AS stored_count, tallies.weight AS stored_weight,"
+        " COUNT(ballots.voter_id) AS ballot_count,"
+        " COALESCE(SUM(voters.weight), 0) AS ballot_weight"
+        " FROM choices"
+        " LEFT JOIN tallies ON tallies.choice_id = choices.id"
+        " LEFT JOIN ballots ON ballots.choice_id = choices.id"
+        " LEFT JOIN voters ON ballots.voter_id = voters.id"
+        " GROUP BY choices.id"
+        " HAVING stored_count IS NOT ballot_count OR stored_weight IS NOT ballot_weight"
+    ).fetchall()
+
+
+def rebuild_tallies(database: sqlite3.Connection) -> None:
+    database.execute("DELETE FROM tallies")
+    database.execute(
+        "INSERT INTO tallies (choice_id, count, weight)"
+        " SELECT choices.id, COUNT(ballots.voter_id), COALESCE(SUM(voters.weight), 0)"
+        " FROM choices"
+        " LEFT JOIN ballots ON ballots.choice_id = choices.id"
+        " LEFT JOIN voters ON ballots.voter_id = voters.id"
+        " GROUP BY choices.id"
+    )
+    database.execute(
+        "UPDATE revisions SET revision = revision + 1, modified = CURRENT_TIMESTAMP"
+    )
+    database.commit()
+
+
+@click.command("rebuild-tallies")
+@click.option("--check", is_flag=True, help="Only report drift, do not rebuild.")
+def rebuild_tallies_command(check: bool) -> None:
+    """Recompute the tally table from the stored ballots."""
+    database = get_database()
+    drift = find_tally_drift(database)
+
+    for item in drift:
+        click.echo(
+            f"Choice {item['choice_id']}:"
+            f" count {item['stored_count']} -> {item['ballot_count']},"
+            f" weight {item['stored_weight']} -> {item['ballot_weight']}"
+        )
+
+    if check:
+        if drift:
+            click.echo(click.style(f"{len(drift)} tallies drifted.", fg="red"), err=True)
+            exit(1)
+        click.echo(click.style("Tallies are consistent.", fg="green"))
+        return
+
+    rebuild_tallies(database)
+    click.echo(click.style(f"Tallies rebuilt, {len(drift)} corrected.", fg="green"))
@@ -0,0 +1,39 @@
+import functools
+
+from flask import g, make_response, request, session, Response
+from typing import Callable
+from werkzeug.http import is_resource_modified
+
+from vote.repository import get_repository
+
+
+def conditional(name: Callable[..., str]) -> Callable:
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            if request.method != "GET" or session.get("_flashes"):
+                return view(**kwargs)
+
+            revision = get_repository().get_revision(name(**kwargs))
+            if revision is None:
+                return view(**kwargs)
+
+            user_id = g.user["id"] if g.user else 0
+            etag = f"{revision['name']}-{revision['revision']}-{user_id}"
+
+            if is_resource_modified(
+                request.environ, etag=etag, last_modified=revision["modified"]
+            ):
+                response = make_response(view(**kwargs))
+            else:
+                response = Response(status=304)
+
+            response.set_etag(etag, weak=True)
+            response.last_modified = revision["modified"]
+            response.cache_control.no_cache = True
+            response.vary.add("Cookie")
+            return response
+
+        return wrapped_view
+
+    return decorator
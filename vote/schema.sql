@@ -1,9 +1,12 @@
-DROP TABLE IF EXISTS users;
-DROP TABLE IF EXISTS polls;
-DROP TABLE IF EXISTS choices;
+DROP TABLE IF EXISTS snapshots;
+DROP TABLE IF EXISTS revisions;
+DROP TABLE IF EXISTS tallies;
 DROP TABLE IF EXISTS ballots;
-DROP TABLE IF EXISTS voters;
 DROP TABLE IF EXISTS tokens;
+DROP TABLE IF EXISTS choices;
+DROP TABLE IF EXISTS polls;
+DROP TABLE IF EXISTS voters;
+DROP TABLE IF EXISTS users;
 
 CREATE TABLE users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,6 +26,9 @@ CREATE TABLE polls (
     CONSTRAINT state_choices CHECK (state IN ("Vorbereitet", "Offen", "Geschlossen", "Gelöscht"))
 );
 
+CREATE INDEX polls_created ON polls (created, id);
+CREATE INDEX polls_state_created ON polls (state, created, id);
+
 CREATE TABLE choices (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     poll_id INTEGER NOT NULL,
@@ -30,18 +36,25 @@ CREATE TABLE choices (
     FOREIGN KEY (poll_id) REFERENCES polls (id)
 );
 
+CREATE INDEX choices_poll_id ON choices (poll_id);
+
 CREATE TABLE ballots (
+    poll_id INTEGER NOT NULL,
     choice_id INTEGER NOT NULL,
     voter_id INTEGER NOT NULL,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (poll_id) REFERENCES polls (id),
     FOREIGN KEY (choice_id) REFERENCES choices (id),
-    FOREIGN KEY (voter_id) REFERENCES tokens (id),
-    CONSTRAINT unique_ballot UNIQUE (choice_id, voter_id)
+    FOREIGN KEY (voter_id) REFERENCES voters (id),
+    CONSTRAINT unique_voter UNIQUE (poll_id, voter_id)
 );
 
+CREATE INDEX ballots_voter_id ON ballots (voter_id);
+
 CREATE TABLE voters (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
+    students INTEGER,
     weight INTEGER NOT NULL DEFAULT 1
 );
 
@@ -52,3 +65,103 @@ CREATE TABLE tokens (
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (voter_id) REFERENCES voters (id)
 );
+
+CREATE INDEX tokens_voter_id_expired ON tokens (voter_id, expired);
+
+CREATE TABLE tallies (
+    choice_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    weight INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (choice_id) REFERENCES choices (id)
+);
+
+CREATE TRIGGER create_tally AFTER INSERT ON choices
+BEGIN
+    INSERT INTO tallies (choice_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER count_ballot AFTER INSERT ON ballots
+BEGIN
+    UPDATE tallies
+    SET count = count + 1,
+        weight = weight + COALESCE((SELECT weight FROM voters WHERE id = NEW.voter_id), 0)
+    WHERE choice_id = NEW.choice_id;
+END;
+
+CREATE TRIGGER discount_ballot AFTER DELETE ON ballots
+BEGIN
+    UPDATE tallies
+    SET count = count - 1,
+        weight = weight - COALESCE((SELECT weight FROM voters WHERE id = OLD.voter_id), 0)
+    WHERE choice_id = OLD.choice_id;
+END;
+
+CREATE TRIGGER reweight_ballots AFTER UPDATE OF weight ON voters
+BEGIN
+    UPDATE tallies
+    SET weight = weight + NEW.weight - OLD.weight
+    WHERE choice_id IN (SELECT choice_id FROM ballots WHERE voter_id = NEW.id);
+END;
+
+CREATE TABLE revisions (
+    name TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL DEFAULT 1,
+    modified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO revisions (name) VALUES ('index');
+
+CREATE TRIGGER revise_created_poll AFTER INSERT ON polls
+BEGIN
+    INSERT INTO revisions (name) VALUES ('poll:' || NEW.id);
+    UPDATE revisions
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP
+    WHERE name = 'index';
+END;
+
+CREATE TRIGGER revise_poll_state AFTER UPDATE OF state ON polls
+BEGIN
+    UPDATE revisions
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP
+    WHERE name IN ('index', 'poll:' || NEW.id);
+END;
+
+CREATE TRIGGER revise_cast_ballot AFTER INSERT ON ballots
+BEGIN
+    UPDATE revisions
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP
+    WHERE name IN ('index', 'poll:' || NEW.poll_id);
+END;
+
+CREATE TRIGGER revise_deleted_ballot AFTER DELETE ON ballots
+BEGIN
+    UPDATE revisions
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP
+    WHERE name IN ('index', 'poll:' || OLD.poll_id);
+END;
+
+CREATE TRIGGER revise_voter AFTER UPDATE OF name, weight ON voters
+BEGIN
+    UPDATE revisions
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP
+    WHERE name = 'index'
+        OR name IN (SELECT 'poll:' || poll_id FROM ballots WHERE voter_id = NEW.id);
+END;
+
+CREATE TABLE snapshots (
+    poll_id INTEGER PRIMARY KEY,
+    results TEXT NOT NULL,
+    fragment TEXT NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (poll_id) REFERENCES polls (id)
+);
+
+CREATE TRIGGER freeze_snapshot BEFORE UPDATE ON snapshots
+BEGIN
+    SELECT RAISE(ABORT, 'Snapshots are immutable.');
+END;
+
+CREATE TRIGGER keep_snapshot BEFORE DELETE ON snapshots
+BEGIN
+    SELECT RAISE(ABORT, 'Snapshots are immutable.');
+END;
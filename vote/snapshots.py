@@ -0,0 +1,163 @@
+import click
+import json
+import sqlite3
+
+from flask import render_template
+from markupsafe import Markup
+
+from vote.database import get_database
+
+
+def tally_poll(
+    database: sqlite3.Connection, poll: sqlite3.Row, recount: bool = False
+) -> list[dict]:
+    return tally_polls(database, [poll], recount)[poll["id"]]
+
+
+def tally_polls(
+    database: sqlite3.Connection, polls: list[sqlite3.Row], recount: bool = False
+) -> dict[int, list[dict]]:
+    poll_ids = [poll["id"] for poll in polls]
+    placeholders = ", ".join("?" for _ in poll_ids)
+
+    if recount:
+        data = database.execute(
+            "SELECT choices.poll_id, choices.name, COUNT(ballots.voter_id) AS count,"
+            " COALESCE(SUM(voters.weight), 0) AS weight"
+            " FROM choices"
+            " LEFT JOIN ballots ON ballots.choice_id = choices.id"
+            " LEFT JOIN voters ON ballots.voter_id = voters.id"
+            f" WHERE choices.poll_id IN ({placeholders})"
+            " GROUP BY choices.poll_id, choices.name"
+            " ORDER BY choices.poll_id, choices.name",
+            poll_ids,
+        )
+    else:
+        data = database.execute(
+            "SELECT choices.poll_id, choices.name, SUM(tallies.count) AS count,"
+            " SUM(tallies.weight) AS weight"
+            " FROM choices"
+            " JOIN tallies ON tallies.choice_id = choices.id"
+            f" WHERE choices.poll_id IN ({placeholders})"
+            " GROUP BY choices.poll_id, choices.name"
+            " ORDER BY choices.poll_id, choices.name",
+            poll_ids,
+        )
+
+    choices = {poll_id: {} for poll_id in poll_ids}
+    for item in data:
+        choices[item["poll_id"]][item["name"]] = {
+            "name": item["name"], "count": item["count"], "weight": item["weight"]
+        }
+
+    named = [poll["id"] for poll in polls if poll["type"] == "Namentlich"]
+    if named:
+        for poll_id in named:
+            for choice in choices[poll_id].values():
+                choice["voters"] = []
+
+        data = database.execute(
+            "SELECT ballots.poll_id, choices.name AS choice, voters.name, voters.weight"
+            " FROM ballots"
+            " JOIN choices ON ballots.choice_id = choices.id"
+            " JOIN voters ON ballots.voter_id = voters.id"
+            f" WHERE ballots.poll_id IN ({', '.join('?' for _ in named)})"
+            " ORDER BY ballots.poll_id, choices.name, voters.name",
+            named,
+        )
+        for item in data:
+            choices[item["poll_id"]][item["choice"]]["voters"].append(
+                {"name": item["name"], "weight": item["weight"]}
+            )
+
+    return {poll_id: list(items.values()) for poll_id, items in choices.items()}
+
+
+def render_results(poll: sqlite3.Row, choices: list[dict]) -> Markup:
+    return Markup(render_template("polls/results.html", poll=poll, choices=choices))
+
+
+def take_snapshot(database: sqlite3.Connection, poll: sqlite3.Row) -> None:
+    choices = tally_poll(database, poll)
+    database.execute(
+        "INSERT INTO snapshots (poll_id, results, fragment) VALUES (?, ?, ?)",
+        (poll["id"], json.dumps(choices), render_results(poll, choices)),
+    )
+
+
+def get_snapshot(database: sqlite3.Connection, poll_id: int) -> list[dict] | None:
+    snapshot = database.execute(
+        "SELECT results FROM snapshots WHERE poll_id = ?",
+        (poll_id,),
+    ).fetchone()
+
+    if snapshot is None:
+        return None
+    return json.loads(snapshot["results"])
+
+
+def get_fragments(
+    database: sqlite3.Connection, polls: list[sqlite3.Row]
+) -> dict[int, Markup]:
+    closed = [poll for poll in polls if poll["state"] == "Geschlossen"]
+    if not closed:
+        return {}
+
+    placeholders = ", ".join("?" for _ in closed)
+    fragments = {
+        item["poll_id"]: Markup(item["fragment"])
+        for item in database.execute(
+            "SELECT poll_id, fragment FROM snapshots"
+            f" WHERE poll_id IN ({placeholders})",
+            [poll["id"] for poll in closed],
+        )
+    }
+
+    missing = [poll for poll in closed if poll["id"] not in fragments]
+    if missing:
+        results = tally_polls(database, missing)
+        for poll in missing:
+            fragments[poll["id"]] = render_results(poll, results[poll["id"]])
+
+    return fragments
+
+
+@click.command("verify-snapshots")
+@click.option("--create-missing", is_flag=True, help="Snapshot closed polls without one.")
+def verify_snapshots_command(create_missing: bool) -> None:
+    """Re-tally closed polls from their ballots and compare with the snapshots."""
+    database = get_database()
+    polls = database.execute(
+        "SELECT polls.id, polls.type, polls.state, snapshots.results"
+        " FROM polls"
+        " LEFT JOIN snapshots ON snapshots.poll_id = polls.id"
+        " WHERE polls.state = 'Geschlossen' OR snapshots.poll_id IS NOT NULL"
+        " ORDER BY polls.id"
+    ).fetchall()
+
+    missing, drifted = [], []
+    for poll in polls:
+        if poll["results"] is None:
+            missing.append(poll)
+            continue
+
+        if json.loads(poll["results"]) != tally_poll(database, poll, recount=True):
+            drifted.append(poll)
+            click.echo(f"Poll {poll['id']}: snapshot differs from its ballots.")
+
+    if create_missing:
+        for poll in missing:
+            take_snapshot(database, poll)
+        database.commit()
+        click.echo(click.style(f"{len(missing)} snapshots created.", fg="green"))
+    else:
+        for poll in missing:
+            click.echo(f"Poll {poll['id']}: no snapshot.")
+
+    if drifted or (missing and not create_missing):
+        msg = f"{len(drifted)} snapshots drifted, {len(missing)} missing."
+        click.echo(click.style(msg, fg="red"), err=True)
+        exit(1)
+
+    msg = f"{len(polls) - len(missing)} snapshots verified."
+    click.echo(click.style(msg, fg="green"))
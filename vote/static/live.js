@@ -0,0 +1,43 @@
+const eventsUrl = document.currentScript.dataset.events;
+const reloadNew = document.currentScript.dataset.reloadNew === 'true';
+
+document.addEventListener('DOMContentLoaded', () => {
+    if (!window.EventSource) {
+        return;
+    }
+
+    const source = new EventSource(eventsUrl);
+
+    source.addEventListener('polls', event => {
+        const ids = JSON.parse(event.data);
+        const $stale = [...document.querySelectorAll('[data-state="Offen"]')]
+            .filter($box => !ids.includes(Number($box.dataset.poll)));
+
+        if ($stale.length > 0) {
+            source.close();
+            window.location.reload();
+        }
+    });
+
+    source.addEventListener('poll', event => {
+        const poll = JSON.parse(event.data);
+        const $box = document.querySelector(`[data-poll="${poll.id}"]`);
+
+        if ($box === null && !(reloadNew && poll.state === 'Vorbereitet')) {
+            return;
+        }
+
+        if ($box === null || $box.dataset.state !== poll.state) {
+            source.close();
+            window.location.reload();
+            return;
+        }
+
+        const $turnout = $box.querySelector('[data-turnout]');
+
+        if ($turnout !== null) {
+            $turnout.textContent = `${poll.ballots} / ${poll.eligible}`;
+        }
+    });
+
+});
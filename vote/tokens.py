@@ -0,0 +1,115 @@
+import collections
+import fcntl
+import os
+import secrets
+import string
+import tempfile
+import threading
+import time
+
+from flask import current_app, Flask
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from vote.repository import Repository
+
+
+def get_token() -> str:
+    chars = string.ascii_uppercase + string.digits
+    token = [secrets.choice(chars) for n in range(6)]
+    return "".join(token)
+
+
+class TokenIndex:
+    def __init__(self, stamp: Path) -> None:
+        self.stamp = stamp
+        self._lock = threading.Lock()
+        self._tokens: dict[str, tuple[int, bool]] = {}
+        self._version: int | None = None
+
+    def _current_version(self) -> int:
+        try:
+            return int(self.stamp.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def load(self, repository: "Repository") -> None:
+        version = self._current_version()
+        tokens = repository.load_tokens()
+
+        with self._lock:
+            self._tokens = tokens
+            self._version = version
+
+    def lookup(self, repository: "Repository", key: str) -> tuple[int, bool] | None:
+        if self._version != self._current_version():
+            self.load(repository)
+        return self._tokens.get(key)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def touch(self) -> None:
+        self.stamp.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.stamp.with_name(f"{self.stamp.name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            descriptor, temporary = tempfile.mkstemp(dir=self.stamp.parent, suffix=".tmp")
+            with os.fdopen(descriptor, "w", encoding="utf-8") as output:
+                output.write(str(self._current_version() + 1))
+            os.replace(temporary, self.stamp)
+
+
+class RateLimiter:
+    def __init__(self, limit: int, window: float) -> None:
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._failures: dict[str, collections.deque[float]] = {}
+
+    def _prune(self, client: str, now: float) -> collections.deque[float] | None:
+        failures = self._failures.get(client)
+        if failures is None:
+            return None
+
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+
+        if not failures:
+            del self._failures[client]
+            return None
+        return failures
+
+    def is_limited(self, client: str) -> bool:
+        with self._lock:
+            failures = self._prune(client, time.monotonic())
+            return failures is not None and len(failures) >= self.limit
+
+    def hit(self, client: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            failures = self._prune(client, now)
+            if failures is None:
+                failures = self._failures[client] = collections.deque()
+            failures.append(now)
+
+
+def get_token_index() -> TokenIndex:
+    return current_app.extensions["tokens"]
+
+
+def get_rate_limiter() -> RateLimiter:
+    return current_app.extensions["token_failures"]
+
+
+def init_application(application: Flask) -> None:
+    application.extensions["tokens"] = TokenIndex(
+        Path(application.config["TOKEN_STAMP"])
+    )
+    application.extensions["token_failures"] = RateLimiter(
+        application.config["TOKEN_FAILURE_LIMIT"],
+        application.config["TOKEN_FAILURE_WINDOW"],
+    )
@@ -1,8 +1,11 @@
 import click
+import csv
 import functools
+import io
+import itertools
 import math
-import string
-import secrets
+import sqlite3
+import time
 
 from flask import (
     abort,
@@ -17,19 +20,32 @@ from flask import (
     Response,
     current_app,
     make_response,
+    stream_template,
 )
-from matplotlib.figure import Figure
-from typing import Any
+from typing import Any, Callable, Iterator, Sequence, TextIO, TYPE_CHECKING
 from werkzeug.security import check_password_hash
 from pathlib import Path
 
 from vote.authentication import login_required
+from vote.codes import get_code, prune_codes, warm_codes, warm_codes_later
 from vote.database import get_database
+from vote.repository import get_repository
+from vote.tokens import get_token_index
+
+if TYPE_CHECKING:
+    import numpy
 
 BASE_DIR = Path(__file__).parent.parent
 
 blueprint = Blueprint("voters", __name__, url_prefix="/voters")
 
+NAME_MAX_LENGTH = 250
+STUDENTS_MIN = 1
+TOKEN_AMOUNT_MIN = 10
+TOKEN_AMOUNT_MAX = 50
+IMPORT_ERRORS_SHOWN = 20
+VOTERS_PER_PAGE = 50
+
 
 @blueprint.route("/info/", methods=("GET", "POST"))
 def info() -> str:
@@ -69,22 +85,59 @@ def info() -> str:
 @blueprint.route("/")
 @login_required
 def index() -> str:
+    search = request.args.get("search", "").strip()
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+
+    conditions, parameters = ["TRUE"], []
+
+    if search:
+        pattern = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("voters.name LIKE ? ESCAPE '\\'")
+        parameters.append(f"%{pattern}%")
+
+    order = "ASC"
+    if after is not None:
+        conditions.append("voters.id > ?")
+        parameters.append(after)
+    elif before is not None:
+        conditions.append("voters.id < ?")
+        parameters.append(before)
+        order = "DESC"
+
     database = get_database()
-    data = database.execute(
-        "SELECT id, name, weight, (SELECT COUNT(key) FROM tokens WHERE tokens.voter_id = voters.id) AS count FROM voters"
+    voters = database.execute(
+        "SELECT voters.id, voters.name, voters.weight,"
+        " COUNT(tokens.voter_id) AS count,"
+        " COUNT(tokens.voter_id) FILTER (WHERE tokens.expired = FALSE) AS active"
+        " FROM voters"
+        " LEFT JOIN tokens ON tokens.voter_id = voters.id"
+        f" WHERE {' AND '.join(conditions)}"
+        " GROUP BY voters.id"
+        f" ORDER BY voters.id {order}"
+        " LIMIT ?",
+        (*parameters, VOTERS_PER_PAGE + 1),
     ).fetchall()
-    voters = []
-    for item in data:
-        voters.append(
-            {
-                "id": item["id"],
-                "name": item["name"],
-                "weight": item["weight"],
-                "count": item["count"],
-            }
-        )
-    print(voters)
-    return render_template("voters/index.html", voters=voters)
+
+    has_more = len(voters) > VOTERS_PER_PAGE
+    voters = voters[:VOTERS_PER_PAGE]
+    if before is not None:
+        voters.reverse()
+
+    previous_id = next_id = None
+    if voters:
+        if after is not None or (before is not None and has_more):
+            previous_id = voters[0]["id"]
+        if before is not None or has_more:
+            next_id = voters[-1]["id"]
+
+    return render_template(
+        "voters/index.html",
+        voters=voters,
+        search=search,
+        previous_id=previous_id,
+        next_id=next_id,
+    )
 
 
 def get_weight(students: int) -> int:
@@ -101,13 +154,31 @@ def get_weight(students: int) -> int:
     return weight
 
 
+def get_weights(students: Sequence[int]) -> "numpy.ndarray":
+    import numpy
+
+    students = numpy.asarray(students, dtype=numpy.int64)
+    weights = numpy.full(students.shape, 4, dtype=numpy.int64)
+
+    n = numpy.minimum(students, 5000) - 999
+    weights += numpy.where(1000 <= students, -(-n // 500), 0)
+
+    n = numpy.minimum(students, 10000) - 5999
+    weights += numpy.where(6000 <= students, -(-n // 1000), 0)
+
+    return weights
+
+
 @click.command("plot-weight")
 def plot_weight_curve() -> None:
+    import numpy
+    from matplotlib.figure import Figure
+
     fig = Figure(figsize=(16, 9))
     ax = fig.subplots()
 
-    x = range(1, 20000)
-    y = [get_weight(n) for n in x]
+    x = numpy.arange(1, 20000)
+    y = get_weights(x)
 
     ax.plot(x, y)
 
@@ -119,28 +190,60 @@ def plot_weight_curve() -> None:
     fig.savefig(file, format="svg")
 
 
+@click.command("reweight")
+@click.option("--yes", is_flag=True, help="Apply the changes without asking.")
+def reweight_command(yes: bool) -> None:
+    """Recompute the weights of all named voters with a known student count."""
+    database = get_database()
+    voters = database.execute(
+        "SELECT id, name, students, weight FROM voters"
+        " WHERE name != '' AND students IS NOT NULL"
+        " ORDER BY id"
+    ).fetchall()
+    weights = get_weights([voter["students"] for voter in voters])
+
+    changes = []
+    for voter, weight in zip(voters, weights.tolist()):
+        if weight != voter["weight"]:
+            changes.append((weight, voter["id"]))
+            click.echo(
+                f"{voter['id']} {voter['name']} ({voter['students']} Studierende):"
+                f" {voter['weight']} -> {weight}"
+            )
+
+    if not changes:
+        click.echo(click.style("All weights are up to date.", fg="green"))
+        return
+
+    if not yes:
+        click.confirm(f"Update the weight of {len(changes)} voters?", abort=True)
+
+    database.executemany("UPDATE voters SET weight = ? WHERE id = ?", changes)
+    database.commit()
+    click.echo(click.style(f"Updated {len(changes)} voters.", fg="green"))
+
+
+def validate_voter(name: str, students: int | None) -> str | None:
+    if name == "" and students not in (None, 1):
+        return "Anonyme Wähler können keine Studierenden haben. (Studierende muss Wert 1 haben.)"
+
+    if students is not None and students < STUDENTS_MIN:
+        return f"Die Anzahl der Studierende muss mindestens {STUDENTS_MIN} betragen."
+
+    if len(name) > NAME_MAX_LENGTH:
+        return f"Name darf maximal {NAME_MAX_LENGTH} Zeichen lang sein."
+
+    return None
+
+
 @blueprint.route("/create/", methods=("GET", "POST"))
 @login_required
 def create() -> str | Response:
-    name_max_length = 250
-    students_min = 1
-
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         students = int(request.form["students"])
 
-        error = None
-
-        if len(name) > name_max_length:
-            error = f"Name darf maximal {name_max_length} Zeichen lang sein."
-
-        if students < students_min:
-            error = (
-                f"Die Anzahl der Studierende muss mindestens {students_min} betragen."
-            )
-
-        if name == "" and students != 1:
-            error = "Anonyme Wähler können keine Studierenden haben. (Studierende muss Wert 1 haben.)"
+        error = validate_voter(name, students)
 
         if error is not None:
             flash(error)
@@ -148,26 +251,143 @@ def create() -> str | Response:
             weight = get_weight(students) if name else 1
             database = get_database()
             database.execute(
-                "INSERT INTO voters (name, weight) VALUES (?, ?)",
-                (name, weight),
+                "INSERT INTO voters (name, students, weight) VALUES (?, ?, ?)",
+                (name, students, weight),
             )
             database.commit()
             return redirect(url_for("voters.index"))
 
     validation = {
-        "name_max": name_max_length,
-        "students_min": students_min,
+        "name_max": NAME_MAX_LENGTH,
+        "students_min": STUDENTS_MIN,
     }
     return render_template("voters/create.html", validation=validation)
 
 
+def read_voters(file: TextIO) -> Iterator[tuple[int, str, int, str | None]]:
+    header = file.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    columns = [
+        column.strip().lower()
+        for column in next(csv.reader([header], delimiter=delimiter), [])
+    ]
+
+    if "name" not in columns or "students" not in columns:
+        yield 1, "", 0, "Die Kopfzeile muss die Spalten 'name' und 'students' enthalten."
+        return
+
+    name_index = columns.index("name")
+    students_index = columns.index("students")
+
+    for line, row in enumerate(csv.reader(file, delimiter=delimiter), start=2):
+        if not any(value.strip() for value in row):
+            continue
+
+        if len(row) <= max(name_index, students_index):
+            yield line, "", 0, "Die Zeile hat zu wenige Spalten."
+            continue
+
+        name = row[name_index].strip()
+        try:
+            students = int(row[students_index])
+        except ValueError:
+            yield line, name, 0, "Die Anzahl der Studierenden muss eine ganze Zahl sein."
+            continue
+
+        yield line, name, students, validate_voter(name, students)
+
+
+def import_voters(
+    database: sqlite3.Connection,
+    file: TextIO,
+    on_error: Callable[[int, str], None],
+    chunk_size: int = 500,
+) -> int:
+    imported = 0
+    rows = read_voters(file)
+
+    while True:
+        chunk = []
+        for line, name, students, error in itertools.islice(rows, chunk_size):
+            if error is not None:
+                on_error(line, error)
+            else:
+                chunk.append((name, students, get_weight(students) if name else 1))
+
+        if not chunk:
+            break
+
+        database.executemany(
+            "INSERT INTO voters (name, students, weight) VALUES (?, ?, ?)", chunk
+        )
+        imported += len(chunk)
+
+    return imported
+
+
+@blueprint.route("/import/", methods=("GET", "POST"))
+@login_required
+def upload_voters() -> str | Response:
+    if request.method == "POST":
+        upload = request.files.get("file")
+
+        if upload is None or not upload.filename:
+            flash("Eine CSV-Datei wird benötigt.")
+        else:
+            errors = []
+            rejected = 0
+
+            def report(line: int, error: str) -> None:
+                nonlocal rejected
+                rejected += 1
+                if len(errors) < IMPORT_ERRORS_SHOWN:
+                    errors.append((line, error))
+
+            database = get_database()
+            file = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+            try:
+                imported = import_voters(database, file, report)
+            except UnicodeDecodeError:
+                database.rollback()
+                flash("Die Datei muss UTF-8 kodiert sein.")
+            else:
+                database.commit()
+                for line, error in errors:
+                    flash(f"Zeile {line}: {error}")
+                if rejected > len(errors):
+                    flash(f"{rejected - len(errors)} weitere fehlerhafte Zeilen.")
+                flash(f"{imported} Wähler importiert, {rejected} Zeilen fehlerhaft.")
+                return redirect(url_for("voters.index"))
+
+    return render_template("voters/import.html")
+
+
+@click.command("import-voters")
+@click.argument("file", type=click.File("r", encoding="utf-8-sig"))
+def import_voters_command(file: TextIO) -> None:
+    """Import voters from a CSV file with the columns 'name' and 'students'."""
+    errors = 0
+
+    def report(line: int, error: str) -> None:
+        nonlocal errors
+        errors += 1
+        click.echo(click.style(f"Line {line}: {error}", fg="red"), err=True)
+
+    database = get_database()
+    try:
+        imported = import_voters(database, file, report)
+    except UnicodeDecodeError:
+        database.rollback()
+        click.echo(click.style("The file must be UTF-8 encoded.", fg="red"), err=True)
+        exit(1)
+    database.commit()
+
+    click.echo(click.style(f"Imported {imported} voters, {errors} rows rejected.", fg="green"))
+
+
 @blueprint.route("/<int:voter_id>/update/", methods=("GET", "POST"))
 @login_required
 def update(voter_id: int) -> str | Response:
-    name_max_length = 250
-    weight_min = 1
-    weight_max = 20
-
     database = get_database()
     voter = database.execute(
         "SELECT * FROM voters WHERE id = ?",
@@ -179,12 +399,9 @@ def update(voter_id: int) -> str | Response:
 
     if request.method == "POST":
         name = request.form.get("name", "").strip()
-        weight = int(request.form["weight"])
-
-        error = None
+        students = request.form.get("students", type=int)
 
-        if len(name) > name_max_length:
-            error = f"Name darf maximal {name_max_length} Zeichen lang sein."
+        error = validate_voter(name, students)
 
         if name == "" and voter["name"] != "":
             error = "Namentlicher Wähler kann nicht anonymisiert werden."
@@ -192,132 +409,197 @@ def update(voter_id: int) -> str | Response:
         if name != "" and voter["name"] == "":
             error = "Anonyme Wähler können nicht namentlich gemacht werden."
 
-        if weight < weight_min:
-            error = f"Die Anzahl der Stimmen muss mindestens {weight_min} betragen."
-
-        if weight > weight_max:
-            error = f"Die Anzahl der Stimmen darf maximal {weight_max} betragen."
-
-        if name == "" and weight != 1:
-            error = "Anonyme Wähler müssen 1 Stimme haben."
-
         if error is not None:
             flash(error)
         else:
-            database = get_database()
+            weight = voter["weight"]
+            if students is None:
+                students = voter["students"]
+            elif students != voter["students"]:
+                weight = get_weight(students) if name else 1
+
             database.execute(
-                "UPDATE voters SET name = ?, weight = ? WHERE id = ?",
-                (name, weight, voter_id),
+                "UPDATE voters SET name = ?, students = ?, weight = ? WHERE id = ?",
+                (name, students, weight, voter_id),
             )
             database.commit()
             flash("Wähler aktualisiert.")
             return redirect(url_for("voters.index"))
 
     validation = {
-        "name_max": name_max_length,
-        "weight_min": weight_min,
-        "weight_max": weight_max,
+        "name_max": NAME_MAX_LENGTH,
+        "students_min": STUDENTS_MIN,
     }
     return render_template("voters/update.html", validation=validation, voter=voter)
 
 
-def get_token() -> str:
-    chars = string.ascii_uppercase + string.digits
-    token = [secrets.choice(chars) for n in range(6)]
-    return "".join(token)
-
-
 @blueprint.route("/<int:voter_id>/tokens/", methods=("GET", "POST"))
 @login_required
 def create_tokens(voter_id: int) -> str | Response:
-    database = get_database()
-    count = database.execute(
-        "SELECT COUNT(key) FROM tokens WHERE voter_id = ? AND expired = FALSE",
-        (voter_id,),
-    ).fetchone()
-    has_tokens = count[0] > 0
+    repository = get_repository()
+    voter = repository.get_voter(voter_id)
 
-    amount_min = 10
-    amount_max = 50
+    if voter is None:
+        abort(404, "Wähler mit dieser ID existiert nicht.")
+
+    has_tokens = repository.count_tokens(voter_id) > 0
 
     if request.method == "POST":
         amount = int(request.form["amount"])
 
-        error = None
-
-        if amount < amount_min:
-            error = f"Es müssen mindestens {amount_min} Tokens erstellt werden."
-
-        if amount > amount_max:
-            error = f"Es können maximal {amount_max} Tokens erstellt werden."
+        error = validate_token_amount(amount)
 
         if error is not None:
             flash(error)
         else:
-            if has_tokens:
-                database.execute(
-                    "UPDATE tokens SET expired = TRUE WHERE voter_id = ?",
-                    (voter_id,),
-                )
-                database.commit()
+            try:
+                repository.generate_tokens([voter_id], amount)
+            except RuntimeError as exception:
+                abort(500, str(exception))
+            prune_codes(repository)
+            get_token_index().touch()
+            warm_codes_later(repository, voter_id)
 
-            existing_tokens = set(database.execute("SELECT key FROM tokens").fetchall())
+            flash("Neuer Tokensatz wurden generiert.")
+            return redirect(url_for("voters.index"))
 
-            tokens = set()
+    validation = {
+        "amount_min": TOKEN_AMOUNT_MIN,
+        "amount_max": TOKEN_AMOUNT_MAX,
+    }
+    return render_template(
+        "voters/tokens.html", validation=validation, has_tokens=has_tokens
+    )
 
-            counter = 0
-            while len(tokens) < amount:
-                if counter > 20:
-                    abort(500, "Failed to generate token set.")
-                token = get_token()
-                if token in existing_tokens:
-                    counter += 1
-                    continue
-                tokens.add(token)
 
-            database.executemany(
-                "INSERT INTO tokens (voter_id, key) VALUES (?, ?)",
-                [(voter_id, token) for token in tokens],
-            )
-            database.commit()
+@blueprint.route("/tokens/", methods=("GET", "POST"))
+@login_required
+def create_all_tokens() -> str | Response:
+    repository = get_repository()
 
-            flash("Neuer Tokensatz wurden generiert.")
+    if request.method == "POST":
+        amount = int(request.form["amount"])
+        scope = request.form.get("scope", "all")
+
+        error = validate_token_amount(amount)
+
+        if scope not in ("all", "missing"):
+            error = "Unbekannte Auswahl der Wähler."
+
+        if error is not None:
+            flash(error)
+        else:
+            voter_ids = repository.get_token_voter_ids(missing_only=scope == "missing")
+            try:
+                generated = repository.generate_tokens(voter_ids, amount)
+            except RuntimeError as exception:
+                abort(500, str(exception))
+            prune_codes(repository)
+            get_token_index().touch()
+            warm_codes_later(repository)
+
+            flash(f"{generated} Tokens für {len(voter_ids)} Wähler wurden generiert.")
             return redirect(url_for("voters.index"))
 
     validation = {
-        "amount_min": amount_min,
-        "amount_max": amount_max,
+        "amount_min": TOKEN_AMOUNT_MIN,
+        "amount_max": TOKEN_AMOUNT_MAX,
     }
-    return render_template(
-        "voters/tokens.html", validation=validation, has_tokens=has_tokens
+    return render_template("voters/bulk_tokens.html", validation=validation)
+
+
+def validate_token_amount(amount: int) -> str | None:
+    if amount < TOKEN_AMOUNT_MIN:
+        return f"Es müssen mindestens {TOKEN_AMOUNT_MIN} Tokens erstellt werden."
+
+    if amount > TOKEN_AMOUNT_MAX:
+        return f"Es können maximal {TOKEN_AMOUNT_MAX} Tokens erstellt werden."
+
+    return None
+
+
+@click.command("generate-tokens")
+@click.option(
+    "--amount",
+    default=30,
+    show_default=True,
+    type=click.IntRange(TOKEN_AMOUNT_MIN, TOKEN_AMOUNT_MAX),
+)
+@click.option(
+    "--voter",
+    "voter_ids",
+    multiple=True,
+    type=int,
+    help="Voter ID, can be repeated. Defaults to all voters.",
+)
+@click.option("--missing-only", is_flag=True, help="Only voters without valid tokens.")
+def generate_tokens_command(
+    amount: int, voter_ids: tuple[int, ...], missing_only: bool
+) -> None:
+    """Generate new token sets for many voters in one transaction."""
+    repository = get_repository()
+
+    if voter_ids and missing_only:
+        msg = "--voter and --missing-only can't be combined."
+        click.echo(click.style(msg, fg="red"), err=True)
+        exit(1)
+
+    if voter_ids:
+        unknown = sorted(
+            {voter_id for voter_id in voter_ids if repository.get_voter(voter_id) is None}
+        )
+        if unknown:
+            msg = f"Unknown voter IDs: {', '.join(map(str, unknown))}."
+            click.echo(click.style(msg, fg="red"), err=True)
+            exit(1)
+    else:
+        voter_ids = repository.get_token_voter_ids(missing_only=missing_only)
+
+    start = time.perf_counter()
+    try:
+        generated = repository.generate_tokens(list(voter_ids), amount)
+    except RuntimeError as exception:
+        click.echo(click.style(str(exception), fg="red"), err=True)
+        exit(1)
+    duration = time.perf_counter() - start
+    prune_codes(repository)
+    get_token_index().touch()
+
+    rate = generated / duration if duration else 0
+    msg = (
+        f"Generated {generated} tokens for {len(voter_ids)} voters"
+        f" in {duration:.2f}s ({rate:.0f} tokens/s)."
     )
+    click.echo(click.style(msg, fg="green"))
+
+    base_url = current_app.config["CODE_BASE_URL"]
+    if base_url is None:
+        click.echo("Set CODE_BASE_URL to render the QR codes in advance.")
+        return
+
+    start = time.perf_counter()
+    warm_codes(repository, base_url)
+    duration = time.perf_counter() - start
+    click.echo(click.style(f"Rendered the QR codes in {duration:.2f}s.", fg="green"))
 
 
 @blueprint.route("/<int:voter_id>/tokens/print/")
 @login_required
 def printable(voter_id: int) -> str:
-    database = get_database()
-    voter_raw = database.execute(
-        "SELECT id, name, weight FROM voters WHERE id = ?",
-        (voter_id,),
-    ).fetchone()
-    voter = {
-        "id": voter_raw["id"],
-        "name": voter_raw["name"] or "Anonym",
-        "weight": voter_raw["weight"],
-    }
-    created = database.execute(
-        "SELECT DISTINCT created FROM tokens WHERE voter_id = ? ORDER BY created DESC",
-        (voter_id,),
-    ).fetchone()[0]
-    tokens = database.execute(
-        "SELECT * FROM tokens WHERE voter_id = ? and created = ?",
-        (voter_id, created),
-    ).fetchall()
+    sheets = list(get_repository().get_sheets(voter_id))
 
-    if not tokens:
+    if not sheets:
         abort(404, f"Voter with ID {voter_id} does not have any tokens.")
 
-    return render_template(
-        "voters/printable.html", voter=voter, tokens=tokens, created=created
+    return render_template("voters/printable.html", sheets=sheets, code=get_code)
+
+
+@blueprint.route("/tokens/print/")
+@login_required
+def printable_all() -> Response:
+    return Response(
+        stream_template(
+            "voters/printable.html", sheets=get_repository().get_sheets(), code=get_code
+        ),
+        mimetype="text/html",
     )